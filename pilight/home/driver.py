@@ -1,34 +1,10 @@
-import json
+from pilight.bus import get_bus
+from pilight.classes import Color
 
-from django.conf import settings
 
-from pilight.classes import Color, PikaConnection
-
-
-# Pika message passing setup
 # Helper functions for controlling the light driver
-def publish_message(msg, first=True):
-    channel = PikaConnection.get_channel()
-    if not channel:
-        # Connection failed to open
-        print('Unable to connect to Pika channel')
-        return
-    try:
-        channel.basic_publish(exchange='', routing_key=settings.PIKA_QUEUE_NAME, body=json.dumps(msg))
-
-    # Current version of Pika can be a little unstable - catch ANY exception
-    except:
-        print('Pika channel publish failed - clearing objects to try again')
-        # Force the channel to try reconnecting next time
-        PikaConnection.clear_channel()
-
-        # Someone closed our connection - attempt the publish again to refresh
-        # (But only if it's the first time)
-        if first:
-            publish_message(msg, first=False)
-        else:
-            # Not the first time - there is something bigger going on - fail silently
-            pass
+def publish_message(msg):
+    get_bus().publish(msg)
 
 
 def message_start():
@@ -56,6 +32,37 @@ def message_restart():
     })
 
 
+def message_transform_params(transform_id, params, variable_params):
+    publish_message({
+        'command': 'params',
+        'transformId': transform_id,
+        'params': params,
+        'variableParams': variable_params,
+    })
+
+
+def message_variable_params(variable_id, params):
+    publish_message({
+        'command': 'params',
+        'variableId': variable_id,
+        'params': params,
+    })
+
+
+def message_config_changed(config_id):
+    publish_message({
+        'command': 'config',
+        'configId': config_id,
+    })
+
+
+def message_profile(duration):
+    publish_message({
+        'command': 'profile',
+        'duration': duration,
+    })
+
+
 def message_color_channel(channel, color):
     # Make sure we got a color
     if not isinstance(color, Color):
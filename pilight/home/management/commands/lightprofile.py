@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from home import driver
+
+
+class Command(BaseCommand):
+    help = 'Profiles the running light driver for a number of seconds, without restarting it'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--duration',
+            type=float,
+            dest='duration',
+            default=10.0,
+            help='Number of seconds to profile for',
+        )
+
+    def handle(self, *args, **options):
+        driver.message_profile(options['duration'])
+        print('Requested a {} sec profile - results will be written to {}'.format(
+            options['duration'], settings.LIGHTS_PROFILE_DIR))
@@ -0,0 +1,24 @@
+import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+
+from pilight.timing import format_summary
+
+
+class Command(BaseCommand):
+    help = 'Displays the latest per-transform timings reported by the running light driver'
+
+    def handle(self, *args, **options):
+        timing = cache.get(settings.DRIVER_TIMING_CACHE_ID)
+        if not timing:
+            print('No timings available')
+            print('Make sure the light driver is running, with LIGHTS_TIMING enabled')
+            return
+
+        reported = datetime.datetime.fromtimestamp(timing['time'])
+        print('Timings reported at {}'.format(reported.strftime('%Y-%m-%d %H:%M:%S')))
+        print('')
+        for line in format_summary(timing['summary']):
+            print(line)
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-18 12:00
+
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0013_auto_20170802_2008'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='config',
+            name='version',
+            field=models.IntegerField(default=0),
+        ),
+    ]
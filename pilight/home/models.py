@@ -11,6 +11,8 @@ class Config(models.Model):
 
     name = models.CharField(max_length=30)
     description = models.TextField(blank=True, null=True)
+    # Incremented each time the config is saved
+    version = models.IntegerField(default=0)
 
     def __unicode__(self):
         return self.name
@@ -5,8 +5,11 @@ when you run "manage.py test".
 Replace this with more appropriate tests for your application.
 """
 
+import numpy as np
 from django.test import TestCase
 
+from pilight.devices.protocol import PacketDecoder, PacketEncoder
+
 
 class SimpleTest(TestCase):
     def test_basic_addition(self):
@@ -14,3 +17,41 @@ class SimpleTest(TestCase):
         Tests that 1 + 1 always equals 2.
         """
         self.assertEqual(1 + 1, 2)
+
+
+class ProtocolTest(TestCase):
+    def test_round_trip(self):
+        """
+        Tests that frames survive encoding and decoding, for both keyframes
+        and deltas - clients decode these in a separate codebase
+        """
+        encoder = PacketEncoder('rgbw', keyframe_interval=3)
+        decoder = PacketDecoder()
+        random = np.random.RandomState(0)
+
+        frame = random.randint(0, 256, size=(50, 4)).astype(np.uint8)
+        for i in range(6):
+            # Change a few separate spans of LEDs each frame
+            frame = frame.copy()
+            frame[i:i + 2] = random.randint(0, 256, size=(2, 4))
+            frame[30 + i] = random.randint(0, 256, size=4)
+
+            decoded = decoder.decode(encoder.encode(frame, 1000.0 + i))
+            np.testing.assert_array_equal(decoded, frame)
+            self.assertEqual(decoder.layout, 'rgbw')
+            self.assertEqual(decoder.timestamp, 1000.0 + i)
+
+    def test_missed_packet(self):
+        """
+        Tests that deltas are dropped after a missed packet, until the next keyframe
+        """
+        encoder = PacketEncoder('rgb', keyframe_interval=3)
+        decoder = PacketDecoder()
+        frames = [np.zeros((10, 3), dtype=np.uint8) for _ in range(4)]
+        for i, frame in enumerate(frames):
+            frame[i] = 100
+        packets = [encoder.encode(frame, 0.0) for frame in frames]
+
+        np.testing.assert_array_equal(decoder.decode(packets[0]), frames[0])
+        self.assertIsNone(decoder.decode(packets[2]))
+        np.testing.assert_array_equal(decoder.decode(packets[3]), frames[3])
@@ -143,6 +143,10 @@ def save_config(request):
             # Remove existing lights/transforms
             config.light_set.all().delete()
             config.transforminstance_set.all().delete()
+
+            # Make sure the driver doesn't keep running the old version
+            config.version += 1
+            config.save()
         else:
             # Create new config
             config = Config()
@@ -175,6 +179,8 @@ def save_config(request):
                 variable_param.transform = transform_instance
                 variable_param.save()
 
+        driver.message_config_changed(config.id)
+
     else:
         return fail_json('Must specify a config name')
 
@@ -194,7 +200,9 @@ def delete_config(request):
             TransformInstance.objects.filter(config=config).delete()
 
             # Finally, delete the config itself
+            config_id = config.id
             config.delete()
+            driver.message_config_changed(config_id)
 
         else:
             return fail_json('Invalid config specified')
@@ -347,7 +355,7 @@ def preview(request):
     frame_dicts = []
 
     for frame in frames:
-        frame_dicts.append([color.flatten_alpha().safe_dict() for color in frame])
+        frame_dicts.append([color.safe_dict() for color in frame.flatten_alpha().to_colors()])
 
     return success_json({'frames': frame_dicts})
 
@@ -507,7 +515,8 @@ def update_transform(request):
     else:
         return fail_json('Must supply transform and params')
 
-    driver.message_restart()
+    # The chain itself hasn't changed, so the driver can update the transform in place
+    driver.message_transform_params(result['id'], result['params'], result['variableParams'])
     return success_json({'transform': result})
 
 
@@ -632,6 +641,8 @@ def update_variable(request):
 
                 variable_instance.params = json.dumps(params_dict)
 
+                # The driver looks some variables up by name, so renaming requires a restart
+                renamed = 'name' in req and req['name'] != variable_instance.name
                 if 'name' in req:
                     variable_instance.name = req['name']
 
@@ -651,7 +662,10 @@ def update_variable(request):
     else:
         return fail_json('Must supply variable and params')
 
-    driver.message_restart()
+    if renamed:
+        driver.message_restart()
+    else:
+        driver.message_variable_params(result['id'], result['params'])
     return success_json({'variable': result})
 
 
@@ -0,0 +1,263 @@
+import json
+import os
+import socket
+import threading
+
+import pika
+from django.conf import settings
+from pika import exceptions
+
+from pilight.classes import PikaConnection
+
+# How long to wait before reconnecting, if the connection fails (secs)
+RETRY_INTERVAL = 30.0
+
+# How often consumers check whether they have been stopped, while no
+# messages are arriving (secs)
+INACTIVITY_TIMEOUT = 1.0
+
+# Largest control message that the socket bus can carry (bytes)
+MAX_DATAGRAM_SIZE = 65536
+
+
+class ConsumerBase(threading.Thread):
+    """
+    Receives control messages on a background thread, passing each one to
+    on_message as soon as it arrives
+    """
+
+    def __init__(self, on_message):
+        super(ConsumerBase, self).__init__()
+        self.daemon = True
+        self.on_message = on_message
+        self.stopped = threading.Event()
+
+    def stop(self):
+        self.stopped.set()
+        self.join(INACTIVITY_TIMEOUT * 2)
+
+
+class ControlBusBase(object):
+    """
+    Carries control messages (start, stop, color, etc) from the web
+    application to the light driver. Messages are dicts, which must be
+    JSON serializable.
+    """
+
+    def publish(self, msg):
+        raise NotImplementedError()
+
+    def get_consumer(self, on_message):
+        """
+        Returns a consumer thread that passes each message received to
+        on_message - the caller is responsible for starting it
+        :rtype: ConsumerBase
+        """
+        raise NotImplementedError()
+
+
+class PikaConsumer(ConsumerBase):
+    """
+    Consumes control messages from the Pika queue. Pika's blocking
+    connections aren't thread safe, so the consumer opens its own, rather
+    than sharing PikaConnection.
+    """
+
+    def run(self):
+        purged = False
+        while not self.stopped.is_set():
+            try:
+                connection = pika.BlockingConnection(
+                    pika.ConnectionParameters(host=settings.PIKA_HOST_NAME, heartbeat=60))
+            except exceptions.AMQPConnectionError:
+                print('Failed to connect... Retrying in {:.0f} seconds'.format(RETRY_INTERVAL))
+                self.stopped.wait(RETRY_INTERVAL)
+                continue
+
+            try:
+                channel = connection.channel()
+                channel.queue_declare(queue=settings.PIKA_QUEUE_NAME, auto_delete=False, durable=True)
+
+                # Purge any stale messages from before the driver started
+                if not purged:
+                    channel.queue_purge(settings.PIKA_QUEUE_NAME)
+                    purged = True
+
+                for method, properties, body in channel.consume(
+                        settings.PIKA_QUEUE_NAME, inactivity_timeout=INACTIVITY_TIMEOUT):
+                    if self.stopped.is_set():
+                        break
+                    if method is None:
+                        continue
+
+                    channel.basic_ack(method.delivery_tag)
+                    if not body:
+                        continue
+
+                    try:
+                        msg = json.loads(body.decode('utf-8'))
+                    except ValueError:
+                        print('Ignoring malformed control message')
+                        continue
+                    self.on_message(msg)
+
+                channel.cancel()
+                connection.close()
+
+            except exceptions.AMQPError:
+                # Someone closed our connection - reconnect
+                print('Lost connection to Pika - reconnecting')
+
+
+class PikaBus(ControlBusBase):
+    """
+    Sends control messages through a RabbitMQ queue
+    """
+
+    def publish(self, msg, first=True):
+        channel = PikaConnection.get_channel()
+        if not channel:
+            # Connection failed to open
+            print('Unable to connect to Pika channel')
+            return
+        try:
+            channel.basic_publish(exchange='', routing_key=settings.PIKA_QUEUE_NAME, body=json.dumps(msg))
+
+        # Current version of Pika can be a little unstable - catch ANY exception
+        except:
+            print('Pika channel publish failed - clearing objects to try again')
+            # Force the channel to try reconnecting next time
+            PikaConnection.clear_channel()
+
+            # Someone closed our connection - attempt the publish again to refresh
+            # (But only if it's the first time)
+            if first:
+                self.publish(msg, first=False)
+            else:
+                # Not the first time - there is something bigger going on - fail silently
+                pass
+
+    def get_consumer(self, on_message):
+        return PikaConsumer(on_message)
+
+
+class SocketConsumer(ConsumerBase):
+    """
+    Receives control messages as datagrams on a Unix domain socket
+    """
+
+    def __init__(self, on_message, path):
+        super(SocketConsumer, self).__init__(on_message)
+        self.path = path
+
+    def run(self):
+        # Clear out the socket left behind by a previous driver
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.bind(self.path)
+        sock.settimeout(INACTIVITY_TIMEOUT)
+        try:
+            while not self.stopped.is_set():
+                try:
+                    data = sock.recv(MAX_DATAGRAM_SIZE)
+                except socket.timeout:
+                    continue
+
+                try:
+                    msg = json.loads(data.decode('utf-8'))
+                except ValueError:
+                    print('Ignoring malformed control message')
+                    continue
+                self.on_message(msg)
+        finally:
+            sock.close()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+
+class SocketBus(ControlBusBase):
+    """
+    Sends control messages as datagrams over a Unix domain socket, for
+    when the web application and the driver run on the same machine. No
+    broker is needed, but messages sent while the driver isn't running
+    are dropped.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def publish(self, msg):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            sock.sendto(json.dumps(msg).encode('utf-8'), self.path)
+        except OSError:
+            # Most likely the driver isn't running
+            print('Unable to send to control socket {}'.format(self.path))
+        finally:
+            sock.close()
+
+    def get_consumer(self, on_message):
+        return SocketConsumer(on_message, self.path)
+
+
+class LocalConsumer(ConsumerBase):
+    """
+    Delivers messages published on a LocalBus, in the same process
+    """
+
+    def __init__(self, on_message, bus):
+        super(LocalConsumer, self).__init__(on_message)
+        self.bus = bus
+
+    def start(self):
+        # Register straight away, so that no messages are missed
+        self.bus.consumers.append(self)
+        super(LocalConsumer, self).start()
+
+    def run(self):
+        self.stopped.wait()
+        self.bus.consumers.remove(self)
+
+
+class LocalBus(ControlBusBase):
+    """
+    Passes control messages directly to consumers in the same process -
+    useful for tests, and for running the driver alongside the web
+    application. Messages published with no consumer running are dropped.
+    """
+
+    def __init__(self):
+        self.consumers = []
+
+    def publish(self, msg):
+        # Round trip through JSON, so that messages are the same as with other buses
+        msg = json.dumps(msg)
+        for consumer in list(self.consumers):
+            consumer.on_message(json.loads(msg))
+
+    def get_consumer(self, on_message):
+        return LocalConsumer(on_message, self)
+
+
+BUSES = {
+    'pika': PikaBus,
+    'socket': lambda: SocketBus(settings.LIGHTS_CONTROL_SOCKET),
+    'local': LocalBus,
+}
+
+_bus = None
+
+
+def get_bus():
+    """
+    Returns the control bus configured by LIGHTS_CONTROL_BUS
+    :rtype: ControlBusBase
+    """
+    global _bus
+    if _bus is None:
+        if settings.LIGHTS_CONTROL_BUS not in BUSES:
+            raise KeyError('Unknown control bus specified, please check your settings')
+        _bus = BUSES[settings.LIGHTS_CONTROL_BUS]()
+    return _bus
@@ -1,6 +1,7 @@
 import struct
 
 from django.conf import settings
+import numpy as np
 import pickle
 import pika
 from pika import exceptions
@@ -222,6 +223,14 @@ class Color(object):
             getattr(self, 'a', 1.0))
 
     # Clone
+    def to_tuple(self):
+        return (
+            self.r,
+            self.g,
+            self.b,
+            getattr(self, 'w', 0.0),
+            getattr(self, 'a', 1.0))
+
     def clone(self):
         return Color(
             self.r,
@@ -366,6 +375,102 @@ class Color(object):
             return Color(v, p, q, w, a)
 
 
+class ColorBuffer(object):
+    """
+    Stores the colors for an entire set of lights as a single contiguous
+    array, with one row per light and one column per channel (r, g, b, w,
+    a). This is the frame representation that flows through the light
+    driver - operating on the whole array at once is far cheaper than
+    doing arithmetic on individual Color objects.
+    Values follow the same conventions as Color - floating point, nominally
+    between 0 and 1, with alpha never affected by multiplication.
+    """
+
+    R = 0
+    G = 1
+    B = 2
+    W = 3
+    A = 4
+    NUM_CHANNELS = 5
+
+    def __init__(self, data):
+        self.data = data
+
+    # Creators
+    @staticmethod
+    def get_dtype():
+        return np.dtype(settings.LIGHTS_BUFFER_DTYPE)
+
+    @staticmethod
+    def zeros(num_positions, dtype=None):
+        """Creates a buffer of opaque black lights"""
+        data = np.zeros((num_positions, ColorBuffer.NUM_CHANNELS), dtype=dtype or ColorBuffer.get_dtype())
+        data[:, ColorBuffer.A] = 1.0
+        return ColorBuffer(data)
+
+    @staticmethod
+    def from_color(color, num_positions, dtype=None):
+        data = np.empty((num_positions, ColorBuffer.NUM_CHANNELS), dtype=dtype or ColorBuffer.get_dtype())
+        data[:] = color.to_tuple()
+        return ColorBuffer(data)
+
+    @staticmethod
+    def from_colors(colors, dtype=None):
+        data = np.array([color.to_tuple() for color in colors], dtype=dtype or ColorBuffer.get_dtype())
+        return ColorBuffer(data.reshape(-1, ColorBuffer.NUM_CHANNELS))
+
+    def to_colors(self):
+        return [Color(*values) for values in self.data.tolist()]
+
+    # Channel access
+    @property
+    def rgbw(self):
+        return self.data[:, :ColorBuffer.A]
+
+    @rgbw.setter
+    def rgbw(self, value):
+        self.data[:, :ColorBuffer.A] = value
+
+    @property
+    def alpha(self):
+        return self.data[:, ColorBuffer.A]
+
+    @alpha.setter
+    def alpha(self, value):
+        self.data[:, ColorBuffer.A] = value
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, index):
+        return Color(*self.data[index].tolist())
+
+    # Operators
+    def __mul__(self, other):
+        # Don't multiply the alpha
+        result = self.clone()
+        result *= other
+        return result
+
+    def __rmul__(self, other):
+        return self * other
+
+    def __imul__(self, other):
+        self.data[:, :ColorBuffer.A] *= other
+        return self
+
+    # Clone
+    def clone(self):
+        return ColorBuffer(self.data.copy())
+
+    # Utility functions
+    def flatten_alpha(self):
+        flattened = self.clone()
+        flattened.rgbw *= flattened.alpha[:, np.newaxis]
+        flattened.alpha = 1.0
+        return flattened
+
+
 def scale_colors(colors, new_len):
     """
     Linearly rescales the input color array to the new length, linearly interpolating between the two
@@ -1,48 +1,105 @@
-import abc
-import multiprocessing
-
-
-class DeviceBase(multiprocessing.Process, metaclass=abc.ABCMeta):
-    def __init__(self, colors_pipe, num_leds, scale, repeat):
-        super(DeviceBase, self).__init__()
-
-        self.strip = None
-        self.colors_pipe = colors_pipe
-        self.num_leds = num_leds
-        self.scale = scale
-        self.repeat = repeat
-
-    @abc.abstractmethod
-    def init(self):
-        pass
-
-    def run(self):
-        self.init()
-        while True:
-            try:
-                colors = self.colors_pipe.recv()
-                if not colors:
-                    print('    Closed light device')
-                    return
-
-                self.show_colors(colors)
-
-            except KeyboardInterrupt:
-                # Ignore a terminate signal - it's handled in the main process, and
-                # we still have cleanup work to do with the lights
-                continue
-
-    def show_colors(self, colors):
-        for r in range(self.repeat):
-            for i, color in enumerate(colors):
-                for s in range(self.scale):
-                    self.set_color(r * self.num_leds + i * self.scale + s, color)
-
-        self.finish()
-
-    @abc.abstractmethod
-    def set_color(self, index, color):
-        pass
-
-    def finish(self):
-        pass
+import abc
+import multiprocessing
+
+import numpy as np
+from django.conf import settings
+
+
+class DeviceBase(multiprocessing.Process, metaclass=abc.ABCMeta):
+    # Order of the channels in strip_buffer, if the device sets one
+    buffer_channel_order = 'rgb'
+
+    def __init__(self, frames, num_leds, scale, repeat):
+        """
+        :param pilight.devices.ring.FrameRing frames: Source of frames from the driver
+        """
+        super(DeviceBase, self).__init__()
+
+        self.strip = None
+        self.frames = frames
+        self.num_leds = num_leds
+        self.scale = scale
+        self.repeat = repeat
+
+        # Frames arrive as rows of 8-bit values, with channels in the configured order.
+        # Every device needs at least r, g and b
+        self.channel_order = settings.LIGHTS_CHANNEL_ORDER.lower()
+        missing = [channel for channel in 'rgb' if channel not in self.channel_order]
+        if missing:
+            raise ValueError('LIGHTS_CHANNEL_ORDER "{}" is missing channels: {}'.format(
+                settings.LIGHTS_CHANNEL_ORDER, ', '.join(missing)))
+
+        # Precompute the light shown by each physical pixel - each light is
+        # scaled across several pixels, then the whole strip is repeated
+        pixels = np.arange(num_leds * scale * repeat)
+        self.index_map = (pixels % (num_leds * scale)) // scale
+
+        # Devices can set this to the strip's raw pixel buffer in init(),
+        # so that each frame is written to the strip in a single operation
+        self.strip_buffer = None
+        self.strip_pixels = None
+        self.gather = None
+
+    @abc.abstractmethod
+    def init(self):
+        pass
+
+    def get_channel_map(self, channels):
+        # Indices of the given channels (e.g. 'rgb') in each encoded frame
+        return [self.channel_order.index(channel) for channel in channels]
+
+    def prepare(self):
+        channels = 'rgb'
+        missing = [channel for channel in self.buffer_channel_order if channel not in self.channel_order]
+        if self.strip_buffer is not None and missing:
+            print('    Strip needs channels missing from LIGHTS_CHANNEL_ORDER ({}), '
+                  'falling back to setting each pixel'.format(', '.join(missing)))
+        elif self.strip_buffer is not None:
+            if len(self.strip_buffer) == len(self.index_map) * len(self.buffer_channel_order):
+                channels = self.buffer_channel_order
+                self.strip_pixels = np.frombuffer(self.strip_buffer, dtype=np.uint8).reshape(
+                    len(self.index_map), len(channels))
+            else:
+                print('    Unexpected strip buffer size, falling back to setting each pixel')
+
+        # Picks out every pixel, with its channels in order, as one lookup
+        self.gather = (self.index_map[:, np.newaxis], self.get_channel_map(channels))
+
+    def run(self):
+        self.init()
+        self.prepare()
+        while True:
+            try:
+                self.frames.wait()
+
+                # Always show the newest frame - any we didn't get to in time are skipped
+                colors = self.frames.read()
+                if colors is not None:
+                    self.show_colors(colors)
+                elif self.frames.is_closed():
+                    print('    Closed light device')
+                    return
+
+            except KeyboardInterrupt:
+                # Ignore a terminate signal - it's handled in the main process, and
+                # we still have cleanup work to do with the lights
+                continue
+
+    def show_colors(self, colors):
+        """
+        :param numpy.ndarray colors: Encoded frame (see pilight.devices.encoder)
+        """
+        if self.strip_pixels is not None:
+            self.strip_pixels[:] = colors[self.gather]
+        else:
+            for index, color in enumerate(colors[self.gather].tolist()):
+                self.set_color(index, color)
+
+        self.finish()
+
+    @abc.abstractmethod
+    def set_color(self, index, color):
+        pass
+
+    def finish(self):
+        pass
@@ -1,16 +1,18 @@
 import base64
-import struct
+import time
 
 from django.conf import settings
 
 from pilight.classes import PikaConnection
 from pilight.devices import base
+from pilight.devices.protocol import PacketEncoder
 
 
 class Device(base.DeviceBase):
-    def __init__(self, colors_pipe, num_leds, scale, repeat):
-        super(Device, self).__init__(colors_pipe, num_leds, scale, repeat)
+    def __init__(self, frames, num_leds, scale, repeat):
+        super(Device, self).__init__(frames, num_leds, scale, repeat)
         self.messages_since_last_queue_check = 0
+        self.packets = PacketEncoder(self.channel_order, settings.LIGHTS_CLIENT_KEYFRAME_INTERVAL)
 
     def init(self):
         pass
@@ -41,8 +43,11 @@ class Device(base.DeviceBase):
             if result.method.message_count > 4000:
                 channel.queue_purge(settings.PIKA_QUEUE_NAME_COLORS)
 
-        # Encode the raw data to base64 for transmission
-        data = base64.b64encode(self.to_data(colors))
+        if settings.LIGHTS_CLIENT_FORMAT == 'binary':
+            data = self.packets.encode(colors, time.time())
+        else:
+            # Clients expect base64 encoded RGB data by default
+            data = base64.b64encode(self.to_data(colors))
         channel.basic_publish(exchange='', routing_key=settings.PIKA_QUEUE_NAME_COLORS, body=data)
 
         self.messages_since_last_queue_check += 1
@@ -51,13 +56,5 @@ class Device(base.DeviceBase):
         pass
 
     def to_data(self, colors):
-        raw_data = bytearray(settings.LIGHTS_NUM_LEDS * 3)
-        pos = 0
-        for color in colors:
-            raw_data[pos * 3:] = (
-                struct.pack('B', color[0]),
-                struct.pack('B', color[1]),
-                struct.pack('B', color[2]),
-            )
-            pos += 1
-        return raw_data
+        # Clients expect packed RGB values
+        return colors[:, self.get_channel_map('rgb')].tobytes()
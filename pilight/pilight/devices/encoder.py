@@ -0,0 +1,70 @@
+import numpy as np
+
+from django.conf import settings
+
+from pilight.classes import ColorBuffer
+
+# Resolution of the gamma lookup table - 16 entries per output level, so
+# that without gamma correction each entry lands exactly on an output level
+LUT_SIZE = 255 * 16 + 1
+
+CHANNELS = {
+    'r': ColorBuffer.R,
+    'g': ColorBuffer.G,
+    'b': ColorBuffer.B,
+    'w': ColorBuffer.W,
+}
+
+
+def get_multipliers():
+    return {
+        'r': settings.LIGHTS_MULTIPLIER_R,
+        'g': settings.LIGHTS_MULTIPLIER_G,
+        'b': settings.LIGHTS_MULTIPLIER_B,
+        'w': settings.LIGHTS_MULTIPLIER_W,
+    }
+
+
+class FrameEncoder(object):
+    """
+    Converts frames into the raw 8-bit values that are sent to the output
+    device, in a single pass over the whole frame:
+      - Alpha is flattened
+      - Channels are picked out in the given order (e.g. 'grb')
+      - Channel multipliers (color correction) are applied
+      - Values are clamped, gamma corrected, and quantized via a lookup table
+    """
+
+    def __init__(self, channel_order=None, multipliers=None, gamma=None):
+        channel_order = (channel_order or settings.LIGHTS_CHANNEL_ORDER).lower()
+        multipliers = multipliers or get_multipliers()
+        gamma = settings.LIGHTS_GAMMA if gamma is None else gamma
+
+        for channel in channel_order:
+            if channel not in CHANNELS:
+                raise ValueError('Unknown channel "{}" in channel order "{}"'.format(channel, channel_order))
+
+        self.channel_order = channel_order
+        self.channels = [CHANNELS[channel] for channel in channel_order]
+
+        # Multipliers are folded into the scale that converts each value to
+        # an index into the lookup table
+        self.scales = np.array([multipliers[channel] for channel in channel_order]) * (LUT_SIZE - 1)
+        # (The small offset stops float error pushing exact levels down to the one below)
+        self.lut = np.floor(np.linspace(0.0, 1.0, LUT_SIZE) ** gamma * 255 + 1e-6).astype(np.uint8)
+
+    @property
+    def num_channels(self):
+        return len(self.channels)
+
+    def encode(self, buffer):
+        """
+        Encodes the given frame
+        :param pilight.classes.ColorBuffer buffer:
+        :return: Array with a row of channel values for each light
+        :rtype: numpy.ndarray
+        """
+        data = buffer.data
+        values = data[:, self.channels] * data[:, ColorBuffer.A:ColorBuffer.A + 1] * self.scales
+        indices = np.clip(values, 0, LUT_SIZE - 1).astype(np.intp)
+        return self.lut[indices]
@@ -0,0 +1,149 @@
+import struct
+
+import numpy as np
+
+# Binary frame format used by the client device. Each packet starts with a
+# header (little endian):
+#   - Version (uint8)
+#   - Flags (uint8) - see FLAG_*
+#   - Sequence number (uint32) - increments by one each packet
+#   - Timestamp (float64) - secs since the epoch
+#   - LED count (uint32)
+#   - Layout length (uint8), followed by the layout - channel order of each
+#     LED as ASCII, e.g. b'rgbw'
+# Keyframes are followed by the full frame - one byte per channel per LED.
+# Otherwise, the packet is a delta against the previous frame, and is
+# followed by a number of spans of changed LEDs:
+#   - Start LED (uint32)
+#   - LED count (uint32)
+#   - The new values for those LEDs
+VERSION = 1
+FLAG_KEYFRAME = 0x01
+
+HEADER = struct.Struct('<BBIdIB')
+SPAN = struct.Struct('<II')
+
+
+class PacketEncoder(object):
+    """
+    Encodes frames into packets, sending only the LEDs that changed since
+    the previous frame. A full keyframe is sent every keyframe_interval
+    packets, so that clients which miss a packet (or connect late) recover.
+    """
+
+    def __init__(self, layout, keyframe_interval):
+        self.layout = layout.encode('ascii')
+        self.keyframe_interval = keyframe_interval
+        self.sequence = 0
+        self.last_keyframe = 0
+        self.previous = None
+
+        # Changes separated by fewer unchanged LEDs than this are sent as a
+        # single span - resending a few LEDs is cheaper than another header
+        self.min_gap = SPAN.size // len(layout) + 1
+
+    def get_spans(self, frame):
+        """
+        Returns the start and end of each span of changed LEDs
+        """
+        changed = np.any(frame != self.previous, axis=1).astype(np.int8)
+        edges = np.diff(np.concatenate(([0], changed, [0])))
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1)
+        if len(starts) == 0:
+            return []
+
+        # Merge spans separated by small gaps
+        breaks = np.flatnonzero(starts[1:] - ends[:-1] >= self.min_gap)
+        return zip(starts[np.append(0, breaks + 1)], ends[np.append(breaks, len(ends) - 1)])
+
+    def encode(self, frame, timestamp):
+        """
+        :param numpy.ndarray frame: Encoded frame (see pilight.devices.encoder)
+        :param float timestamp: Secs since the epoch
+        :rtype: bytes
+        """
+        self.sequence += 1
+        keyframe = (
+            self.previous is None or
+            self.previous.shape != frame.shape or
+            self.sequence - self.last_keyframe >= self.keyframe_interval
+        )
+
+        body = b''
+        if not keyframe:
+            body = b''.join(
+                SPAN.pack(start, end - start) + frame[start:end].tobytes()
+                for start, end in self.get_spans(frame))
+
+            # Fall back to a keyframe if most of the frame changed anyway
+            keyframe = len(body) >= frame.nbytes
+
+        if keyframe:
+            body = frame.tobytes()
+            self.last_keyframe = self.sequence
+
+        self.previous = frame.copy()
+        header = HEADER.pack(
+            VERSION,
+            FLAG_KEYFRAME if keyframe else 0,
+            self.sequence & 0xFFFFFFFF,
+            timestamp,
+            len(frame),
+            len(self.layout))
+
+        return header + self.layout + body
+
+
+class PacketDecoder(object):
+    """
+    Decodes packets produced by PacketEncoder back into frames, for use by
+    clients. Deltas can only be applied on top of the previous packet - if
+    a packet was missed, frames are dropped until the next keyframe.
+    """
+
+    def __init__(self):
+        self.sequence = None
+        self.frame = None
+        self.layout = None
+        self.timestamp = None
+
+    def decode(self, data):
+        """
+        Returns the frame for the given packet, as an array with a row of
+        channel values for each LED (in the order given by self.layout) -
+        or None if it can't be decoded yet
+        :param bytes data:
+        :rtype: numpy.ndarray
+        """
+        version, flags, sequence, timestamp, num_leds, layout_length = HEADER.unpack_from(data)
+        if version != VERSION:
+            raise ValueError('Unsupported packet version {}'.format(version))
+
+        offset = HEADER.size
+        layout = data[offset:offset + layout_length].decode('ascii')
+        offset += layout_length
+        shape = (num_leds, layout_length)
+
+        if flags & FLAG_KEYFRAME:
+            frame = np.frombuffer(data, dtype=np.uint8, count=num_leds * layout_length, offset=offset)
+            frame = frame.reshape(shape).copy()
+        elif self.frame is None or self.frame.shape != shape or sequence != (self.sequence + 1) & 0xFFFFFFFF:
+            # Missed a packet - wait for the next keyframe
+            self.frame = None
+            return None
+        else:
+            frame = self.frame
+            while offset < len(data):
+                start, count = SPAN.unpack_from(data, offset)
+                offset += SPAN.size
+                size = count * layout_length
+                frame[start:start + count] = np.frombuffer(
+                    data, dtype=np.uint8, count=size, offset=offset).reshape(count, layout_length)
+                offset += size
+
+        self.sequence = sequence
+        self.frame = frame
+        self.layout = layout
+        self.timestamp = timestamp
+        return frame.copy()
@@ -0,0 +1,101 @@
+import ctypes
+import multiprocessing
+
+import numpy as np
+
+# Number of frame slots - three lets the driver write a new frame while the
+# device is still reading the previous one, without either waiting
+DEFAULT_SLOTS = 3
+
+# Maximum time that the device waits for a frame before checking for exit (secs)
+WAIT_TIMEOUT = 0.5
+
+
+class FrameRing(object):
+    """
+    Passes encoded frames from the driver to the device process through
+    shared memory. Frames are written into a ring of preallocated slots,
+    each tagged with a sequence number. The device always reads the newest
+    complete frame, skipping any it didn't get to in time - so a slow
+    device never holds up the driver, and frames never queue up.
+
+    Each slot has its own lock, held while a frame is written into it or
+    copied out of it - so a frame is never read while half written. The
+    driver writes to a different slot than the newest one, so it only
+    waits if the device is still copying a frame from two writes ago.
+    """
+
+    def __init__(self, num_leds, num_channels, num_slots=DEFAULT_SLOTS):
+        self.shape = (num_slots, num_leds, num_channels)
+        self.data = multiprocessing.RawArray(ctypes.c_uint8, num_slots * num_leds * num_channels)
+        self.slot_sequences = multiprocessing.RawArray(ctypes.c_uint64, num_slots)
+        self.slot_locks = [multiprocessing.Lock() for _ in range(num_slots)]
+        self.latest = multiprocessing.RawValue(ctypes.c_uint64, 0)
+        self.ready = multiprocessing.Event()
+        self.exit = multiprocessing.Event()
+
+        # Sequence numbers are only tracked by the writing and reading
+        # processes respectively
+        self.write_sequence = 0
+        self.read_sequence = 0
+
+    @property
+    def frames(self):
+        return np.frombuffer(self.data, dtype=np.uint8).reshape(self.shape)
+
+    def write(self, frame):
+        """
+        Writes a new frame. Frames longer than the ring's frames are
+        truncated, shorter frames are padded with zeros
+        :param numpy.ndarray frame: Encoded frame (see pilight.devices.encoder)
+        """
+        self.write_sequence += 1
+        slot = self.write_sequence % self.shape[0]
+        num_leds = min(len(frame), self.shape[1])
+
+        with self.slot_locks[slot]:
+            target = self.frames[slot]
+            target[:num_leds] = frame[:num_leds]
+            target[num_leds:] = 0
+            self.slot_sequences[slot] = self.write_sequence
+
+        self.latest.value = self.write_sequence
+        self.ready.set()
+
+    def read(self):
+        """
+        Returns a copy of the newest complete frame, or None if there
+        hasn't been a new frame since the last read
+        :rtype: numpy.ndarray
+        """
+        while True:
+            sequence = self.latest.value
+            if sequence == self.read_sequence:
+                return None
+
+            slot = sequence % self.shape[0]
+            with self.slot_locks[slot]:
+                if self.slot_sequences[slot] != sequence:
+                    # Already overwritten - try again with the newer frame
+                    continue
+
+                self.read_sequence = sequence
+                return self.frames[slot].copy()
+
+    def wait(self, timeout=WAIT_TIMEOUT):
+        """
+        Waits until a new frame may be available (or the ring is closed)
+        """
+        if not self.exit.is_set():
+            self.ready.wait(timeout)
+        self.ready.clear()
+
+    def close(self):
+        """
+        Signals the reader to exit once it has shown the latest frame
+        """
+        self.exit.set()
+        self.ready.set()
+
+    def is_closed(self):
+        return self.exit.is_set()
@@ -13,6 +13,9 @@ class Device(base.DeviceBase):
             auto_write=False)
         self.strip.show()
 
+        # Frames are written straight into the strip's RGB buffer
+        self.strip_buffer = self.strip._buf
+
     def set_color(self, index, color):
         self.strip[index] = (color[0], color[1], color[2])
 
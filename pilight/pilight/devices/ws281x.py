@@ -12,6 +12,18 @@ class Device(base.DeviceBase):
             auto_write=False)
         self.strip.show()
 
+        # Frames are written straight into the strip's buffer, where the
+        # library exposes it (some versions only return a copy)
+        buf = self.strip.buf
+        if buf is self.strip.buf:
+            self.strip_buffer = buf
+
+            # The strip's order gives the byte offset of each of r, g, b (and w).
+            # It always includes w, so only use as many channels as each pixel has
+            order = self.strip.order
+            channels = 'rgbw'[:self.strip.bpp]
+            self.buffer_channel_order = ''.join(sorted(channels, key=lambda c: order[channels.index(c)]))
+
     def set_color(self, index, color):
         self.strip[index] = (color[0], color[1], color[2])
 
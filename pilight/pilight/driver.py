@@ -1,14 +1,25 @@
+import asyncio
+import collections
 import json
-import multiprocessing
 import time
 
 from django.conf import settings
+from django.core.cache import cache
 
-from home.models import LastPlayed, Light, Playlist, TransformInstance, VariableInstance
+from home.models import Config, LastPlayed, Light, Playlist, TransformInstance, VariableInstance
 from pilight.devices import client, noop, ws2801, ws281x
-from pilight.classes import PikaConnection, Color
+from pilight.devices.encoder import FrameEncoder
+from pilight.devices.ring import FrameRing
+from pilight.bus import get_bus
+from pilight.classes import Color, ColorBuffer
+from pilight.light.chain import TransformChain
+from pilight.light.compiled import CompiledConfig, ConfigCache
+from pilight.light.periodic import FrameCache
 from pilight.light.transforms import BrightnessTransform, TRANSFORMS
 from pilight.light.variables import create_variable
+from pilight.profiling import DriverProfiler
+from pilight.scheduler import FrameScheduler
+from pilight.timing import FrameTimer, format_summary
 
 
 DEVICES = {
@@ -21,13 +32,33 @@ DEVICES = {
 # How often to display FPS (in secs) when running in debug mode
 FPS_INTERVAL = 10.0
 
+# Update interval to use when nothing is animating (secs)
+STATIC_UPDATE_INTERVAL = 1.0
+
+# How long to profile for, if a profile message doesn't say (secs)
+DEFAULT_PROFILE_DURATION = 10.0
+
+# Commands that stop or rebuild the running config
+CONTROL_COMMANDS = ('start', 'stop', 'restart')
+
+# A steady stream of restarts can only hold off a rebuild for this many
+# debounce windows (see LIGHTS_RESTART_DEBOUNCE)
+MAX_RESTART_DEBOUNCES = 4
+
 
 class LightDriver(object):
 
     def __init__(self, simulation=False):
         self.start_time = None
-        self.messages_since_last_queue_check = 0
+        self.messages = collections.deque()
+        self.message_event = None
+        self.collapsed_messages = 0
+        self.rebuilds = 0
         self.color_channels = {}
+        self.frame_cache = FrameCache(settings.LIGHTS_FRAME_CACHE_SIZE, settings.LIGHTS_FRAME_CACHE_MAX_PERIOD)
+        self.config_cache = ConfigCache(settings.LIGHTS_CONFIG_CACHE_SIZE)
+        self.encoder = FrameEncoder()
+        self.profiler = DriverProfiler(settings.LIGHTS_PROFILE_DIR)
 
         if simulation:
             return
@@ -35,11 +66,11 @@ class LightDriver(object):
         if settings.LIGHTS_DEVICE not in DEVICES:
             raise KeyError('Unknown device specified, please check your settings')
 
-        colors_recv, colors_send = multiprocessing.Pipe(duplex=False)
-        self.colors_pipe = colors_send
+        # Encoded frames are passed to the device process through shared memory
+        self.frames = FrameRing(settings.LIGHTS_NUM_LEDS, self.encoder.num_channels)
 
         self.device = DEVICES[settings.LIGHTS_DEVICE](
-            colors_recv,
+            self.frames,
             settings.LIGHTS_NUM_LEDS,
             settings.LIGHTS_SCALE,
             settings.LIGHTS_REPEAT,
@@ -49,55 +80,44 @@ class LightDriver(object):
     def wait(self):
         """
         Main entry point that waits for a start signal before running
-        the actual light driver.
+        the actual light driver. Everything runs in an event loop - control
+        messages are consumed from the control bus on a background thread,
+        and delivered to the loop as soon as they arrive.
         """
-
-        # Basically run this loop forever until interrupted
-        running = True
-
-        # Purge all existing events
-        channel = None
-        while not channel:
-            channel = PikaConnection.get_channel()
-            if not channel:
-                print('Failed to connect... Retrying in 30 seconds')
-                time.sleep(30)
-        channel.queue_purge(settings.PIKA_QUEUE_NAME)
-
-        # If we are configured to autostart, then just go crazy - we don't need Pika until
-        # the driver stops
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self.message_event = asyncio.Event()
+
+        consumer = get_bus().get_consumer(lambda msg: loop.call_soon_threadsafe(self.receive_message, msg))
+        consumer.start()
+        try:
+            loop.run_until_complete(self.run())
+        finally:
+            consumer.stop()
+            loop.close()
+
+    async def run(self):
+        # If we are configured to autostart, then just go crazy
         if settings.AUTO_START:
             last_played = LastPlayed.objects.first()
             if last_played:
-                self.start(last_played.playlist)
+                await self.start(last_played.playlist)
             else:
-                self.start()
-
-        while running:
-            # Try to obtain the channel again
-            channel = None
-            while not channel:
-                channel = PikaConnection.get_channel()
-            if not channel:
-                print('Failed to connect... Retrying in 30 seconds')
-                time.sleep(30)
-
-            # First wait for a "start" or "restart" command
-            # "consume" is a blocking method that will wait for the first message to come in
-            body = None
-            print('* Light driver idle...')
-            for method, properties, body in channel.consume(settings.PIKA_QUEUE_NAME):
-                channel.basic_ack(method.delivery_tag)
-                # Just break out after reading the first message
-                break
+                await self.start()
 
-            # Return any unread messages to the queue
-            channel.cancel()
+        # Basically run this loop forever until interrupted
+        while True:
+            # First wait for a "start" command
+            print('* Light driver idle...')
+            message = None
+            while not message:
+                await self.wait_for_message()
+                message = self.pop_message()
 
             # Note: right now we ignore 'restart' and 'stop' commands if they come in
             # In future we may want to also handle a 'restart' command here
-            message = json.loads(body.decode('utf8'))
-            if message['command'] == 'start':
+            command = message.get('command', None)
+            if command == 'start':
                 # We received a start command!
                 playlist_id = message.get('playlistId', None)
                 if playlist_id:
@@ -109,9 +129,119 @@ class LightDriver(object):
                 LastPlayed.objects.all().delete()
                 LastPlayed(playlist=playlist).save()
 
-                self.start(playlist)
+                await self.start(playlist)
+            elif command == 'color':
+                self.process_color_message(message)
+            elif command == 'config':
+                self.config_cache.invalidate(message.get('configId', None))
+            elif command == 'profile':
+                print('    Not profiling - no config is running')
+
+    def receive_message(self, msg):
+        """
+        Queues a control message - called in the event loop as each message arrives
+        """
+        self.messages.append(msg)
+        self.message_event.set()
+
+    def pop_message(self):
+        """
+        Returns the oldest waiting control message, or None
+        """
+        if not self.messages:
+            return None
+
+        msg = self.messages.popleft()
+        if not self.messages:
+            self.message_event.clear()
+        return msg
+
+    def drain_messages(self):
+        """
+        Returns all of the waiting control messages at once, collapsed
+        into their net effect
+        :rtype: list[dict]
+        """
+        messages = list(self.messages)
+        self.messages.clear()
+        self.message_event.clear()
 
-    def start(self, playlist=None):
+        collapsed = self.collapse_messages(messages)
+        self.collapsed_messages += len(messages) - len(collapsed)
+        return collapsed
+
+    def requeue_messages(self, messages):
+        """
+        Puts drained messages back at the front of the queue, to be handled later
+        """
+        if messages:
+            self.messages.extendleft(reversed(messages))
+            self.message_event.set()
+
+    @staticmethod
+    def collapse_messages(messages):
+        """
+        Collapses a batch of control messages into their net effect:
+          - A restart is dropped if a restart, stop or stop/start is
+            already waiting - each of those rebuilds anyway
+          - A stop replaces a waiting restart, or a waiting stop/start
+          - Colors and params only keep the latest message for each
+            channel, transform or variable, as each message holds the
+            full value
+        Messages are otherwise kept in order
+        :rtype: list[dict]
+        """
+        result = []
+        for msg in messages:
+            command = msg.get('command', None)
+            controls = [m for m in result if m.get('command', None) in CONTROL_COMMANDS]
+            last_control = controls[-1].get('command') if controls else None
+            stop_start = (
+                last_control == 'start' and len(controls) > 1 and controls[-2].get('command') == 'stop'
+            )
+
+            if command == 'restart':
+                if last_control in ('restart', 'stop') or stop_start:
+                    continue
+            elif command == 'stop':
+                if last_control == 'stop':
+                    continue
+                if last_control == 'restart':
+                    result.remove(controls[-1])
+                elif stop_start:
+                    # The earlier stop stands, and the start is cancelled out
+                    result.remove(controls[-1])
+                    continue
+            elif command in ('color', 'params'):
+                key = LightDriver.get_message_key(msg)
+                result = [m for m in result if LightDriver.get_message_key(m) != key]
+
+            result.append(msg)
+
+        return result
+
+    @staticmethod
+    def get_message_key(msg):
+        command = msg.get('command', None)
+        if command == 'color':
+            return command, msg.get('channel', None)
+        if command == 'params':
+            return command, msg.get('transformId', None), msg.get('variableId', None)
+        return None
+
+    async def wait_for_message(self, timeout=None):
+        """
+        Waits until a control message is waiting, or the timeout (secs) passes
+        """
+        if self.messages:
+            return
+
+        try:
+            await asyncio.wait_for(self.message_event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def start(self, playlist=None):
         """
         Main driver entry point once a start signal has been received.
         Takes care of variable lifetime, and restarts the inner loop
@@ -122,19 +252,33 @@ class LightDriver(object):
         # Init variables - these stay "alive" through restarts
         current_variables = self.get_variables()
 
+        # Compiled configs are bound to the variables, so can't be reused from a previous start
+        self.config_cache.clear()
+
         if playlist:
-            playlist_configs = playlist.playlistconfig_set.all()
+            playlist_configs = list(playlist.playlistconfig_set.select_related('config'))
         else:
             playlist_configs = None
 
         restart = True
         if playlist_configs:
             config_index = 0
-            while restart:
+            while restart and playlist_configs:
                 playlist_config = playlist_configs[config_index]
-                run_until = time.time() + playlist.base_duration_secs * playlist_config.duration
 
-                restart = self.run_lights(current_variables, playlist_config.config, run_until)
+                # Skip any configs that have been deleted since the playlist started
+                if playlist_config.config not in self.config_cache and \
+                        not Config.objects.filter(id=playlist_config.config_id).exists():
+                    print('    Skipping deleted config "{}"'.format(playlist_config.config.name))
+                    playlist_configs.pop(config_index)
+                    if config_index >= len(playlist_configs):
+                        config_index = 0
+                    continue
+
+                run_until = time.monotonic() + playlist.base_duration_secs * playlist_config.duration
+
+                self.rebuilds += 1
+                restart = await self.run_lights(current_variables, playlist_config.config, run_until)
 
                 config_index += 1
                 if config_index >= len(playlist_configs):
@@ -144,7 +288,8 @@ class LightDriver(object):
             while restart:
                 # Actually run the light driver
                 # Note that run_lights can return true to request that it be restarted
-                restart = self.run_lights(current_variables)
+                self.rebuilds += 1
+                restart = await self.run_lights(current_variables)
 
         # Clear the lights to black since we're no longer running
         self.clear_lights()
@@ -156,101 +301,260 @@ class LightDriver(object):
         # Reset start_time so that we start over on the next run
         self.start_time = None
 
-    def run_lights(self, current_variables, config=None, run_until=None):
+    async def run_lights(self, current_variables, config=None, run_until=None):
         """
         Drives the actual lights in a continuous loop until a new signal is received.
         Takes care of transform lifetime. Exits upon a stop or restart signal.
+        Control messages are applied at the start of each frame. Restarts are
+        debounced - the current config keeps running until no more restarts
+        have arrived for LIGHTS_RESTART_DEBOUNCE secs, so that a burst of edits
+        only causes a single rebuild.
         """
 
         print('* Light driver running config "{}"...'.format(config.name if config else 'current'))
 
-        # Grab the simulation parameters
-        current_colors = self.get_colors(config)
-        current_transforms = self.get_transforms(current_variables, config)
+        # Grab the simulation parameters - saved configs are only loaded the first time they run
+        if config:
+            compiled = self.config_cache.get_config(
+                config, lambda config: self.compile_config(current_variables, config))
+        else:
+            compiled = self.compile_config(current_variables)
+        current_colors = compiled.colors
+        current_transforms = compiled.transforms
 
         if not current_colors:
             return False
 
-        # Are we animating? (If not, we can operate at a much lower refresh rate).
-        animating = False
-        for transform in current_transforms:
-            if transform.is_animated():
-                animating = True
-                break
+        # Awful hack to force brightness based on a variable, if present
+        # TODO: Formalize an actual mechanism for configuring global brightness
+        brightness_var = self.get_brightness_variable(current_variables)
+
+        animating, periodic_frames, static_interval = self.get_frame_source(
+            current_colors, current_transforms, brightness_var)
 
         # Run the simulation
         if not self.start_time:
-            self.start_time = time.time()
-        last_message_check = self.start_time
-
-        # Awful hack to force brightness based on a variable, if present
-        # TODO: Formalize an actual mechanism for configuring global brightness
-        brightness_var = VariableInstance.objects.get_current().filter(name='Brightness').first()
-
-        frame_count = 0
-        last_fps_time = time.time()
-        running = True
-        while running:
-            # Setup the current iteration
-            current_time = time.time()
+            self.start_time = time.monotonic()
+
+        scheduler = FrameScheduler(settings.LIGHTS_UPDATE_INTERVAL, settings.LIGHTS_OVERRUN_POLICY)
+
+        # Optionally time each part of the frame
+        timer = FrameTimer() if settings.LIGHTS_TIMING else None
+        last_timing_report = time.monotonic()
+
+        # Time that the config started running, and when the first and last
+        # pending restart requests arrived
+        run_start = time.monotonic()
+        first_restart = None
+        last_restart = None
+
+        # When params last changed, if frames may need to be pre-rendered again once they settle
+        last_params_change = None
+
+        first_frame = True
+        while True:
+            if not animating and not first_frame:
+                timeout = static_interval
+                if run_until:
+                    timeout = min(timeout or float('inf'), max(0.0, run_until - time.monotonic()))
+                if last_restart is not None:
+                    restart_at = self.get_restart_time(run_start, first_restart, last_restart)
+                    timeout = min(timeout or float('inf'), max(0.0, restart_at - time.monotonic()))
+                if self.profiler.running:
+                    timeout = min(timeout or float('inf'), max(0.0, self.profiler.end_time - time.monotonic()))
+                await self.wait_for_message(timeout)
+                scheduler.resync()
+            first_frame = False
+
+            # Setup the current iteration - frames are computed for the time they were scheduled for
+            current_time = await scheduler.wait_async()
             if run_until and current_time > run_until:
                 return True
 
             elapsed_time = current_time - self.start_time
-            frame_count += 1
-
-            # Display FPS when in debug mode
-            if settings.LIGHTS_DRIVER_DEBUG and current_time - last_fps_time > FPS_INTERVAL:
-                print('      FPS: %0.1f' % (float(frame_count) / (current_time - last_fps_time)))
-                last_fps_time = current_time
-                frame_count = 0
-
-            # Check for messages only once every so often...
-            # Slight optimization to stop rabbitmq getting hammered every frame
-            if current_time - last_message_check > settings.LIGHTS_MESSAGE_CHECK_INTERVAL:
-                msg = self.pop_message()
-                last_message_check = current_time
-                if msg:
-                    command = msg.get('command', None)
-                    if command == 'stop':
-                        print('    Stopping')
-                        return False
-                    elif command == 'restart':
-                        print('    Restarting')
-                        return True
-                    elif command == 'color':
-                        self.process_color_message(msg)
+
+            # Display frame stats when in debug mode
+            if settings.LIGHTS_DRIVER_DEBUG and animating and current_time - scheduler.stats_start > FPS_INTERVAL:
+                print('      ' + scheduler.format_stats())
+                scheduler.reset_stats()
+
+            if timer and current_time - last_timing_report > settings.LIGHTS_TIMING_INTERVAL:
+                self.report_timing(timer)
+                last_timing_report = current_time
+
+            if self.profiler.is_done(current_time):
+                self.profiler.stop(list(current_transforms) + list(current_variables.values()))
+
+            # Apply any control messages that arrived since the last frame
+            messages = self.drain_messages()
+            for index, msg in enumerate(messages):
+                command = msg.get('command', None)
+                if command == 'stop':
+                    print('    Stopping')
+                    if self.profiler.running:
+                        self.profiler.stop(list(current_transforms) + list(current_variables.values()))
+
+                    # Anything after the stop (e.g. a start) is handled once idle
+                    self.requeue_messages(messages[index + 1:])
+                    return False
+                elif command == 'restart':
+                    if first_restart is None:
+                        first_restart = current_time
+                    else:
+                        # Merged into the restart that's already pending
+                        self.collapsed_messages += 1
+                    last_restart = current_time
+                elif command == 'color':
+                    self.process_color_message(msg)
+                elif command == 'profile':
+                    self.profiler.start(float(msg.get('duration', DEFAULT_PROFILE_DURATION)))
+                elif command == 'config':
+                    self.config_cache.invalidate(msg.get('configId', None))
+                elif command == 'params':
+                    if periodic_frames:
+                        # Transforms aren't run while frames are replayed - bring any stateful
+                        # ones up to date first, so they carry on from the same phase
+                        current_transforms.tick_frame(elapsed_time, len(current_colors))
+                        current_transforms.transform_buffer(elapsed_time, current_colors)
+                    if not self.apply_params(msg, current_transforms, current_variables):
+                        if first_restart is None:
+                            first_restart = current_time
+                        last_restart = current_time
+                    # Params tend to arrive in a stream (e.g. dragging a slider), so render
+                    # frames live until they settle, rather than pre-rendering every change
+                    animating, periodic_frames, static_interval = self.get_frame_source(
+                        current_colors, current_transforms, brightness_var, render_periodic=False)
+                    last_params_change = current_time
+
+            if last_params_change is not None and \
+                    current_time >= last_params_change + settings.LIGHTS_RESTART_DEBOUNCE:
+                animating, periodic_frames, static_interval = self.get_frame_source(
+                    current_colors, current_transforms, brightness_var)
+                last_params_change = None
+
+            if last_restart is not None and current_time >= self.get_restart_time(
+                    run_start, first_restart, last_restart):
+                print('    Restarting ({} rebuilds, {} messages collapsed so far)'.format(
+                    self.rebuilds, self.collapsed_messages))
+                return True
 
             # Note that we always start from the same base lights on each iteration
             # The previous iteration has no effect on the current iteration
-            colors = self.do_step(current_colors, elapsed_time, current_transforms, current_variables)
+            if periodic_frames:
+                self.tick_variables(elapsed_time, current_variables, timer)
+                colors = periodic_frames.get_buffer(elapsed_time)
+            else:
+                colors = self.do_step(current_colors, elapsed_time, current_transforms, current_variables, timer)
 
             # Awful hack to force brightness based on a variable, if present
             # TODO: Formalize an actual mechanism for configuring global brightness
             if brightness_var:
-                brightness = current_variables[brightness_var.id].get_value()
-                for index, color in enumerate(colors):
-                    colors[index] = color * brightness
+                colors *= brightness_var.get_value()
 
             # Send new colors to device
-            self.set_colors(colors)
-
-            # Rate limit
-            # If we have no transforms, don't bother updating very often
-            if not animating:
-                time.sleep(1)
+            if timer:
+                start = timer.now()
+                self.set_colors(colors)
+                timer.record('Output', timer.now() - start)
             else:
-                # Otherwise, sleep based on the requested update interval
-                sleep_time = settings.LIGHTS_UPDATE_INTERVAL - (time.time() - current_time)
-                if sleep_time > 0:
-                    time.sleep(sleep_time)
+                self.set_colors(colors)
+            scheduler.frame_done()
+
+    @staticmethod
+    def get_restart_time(run_start, first_restart, last_restart):
+        """
+        Returns when a pending restart should happen - once no restarts have
+        arrived for the debounce window, but no more than a few windows after
+        the first one. Rebuilds are also kept at least one window apart
+        """
+        debounce = settings.LIGHTS_RESTART_DEBOUNCE
+        restart_at = min(last_restart + debounce, first_restart + debounce * MAX_RESTART_DEBOUNCES)
+        return max(restart_at, run_start + debounce)
+
+    def get_frame_source(self, current_colors, current_transforms, brightness_var, render_periodic=True):
+        """
+        Works out how frames should be produced for the given transforms
+        :param bool render_periodic: Whether frames may be pre-rendered, if the transforms are periodic
+        :return: Whether the transforms are animating, pre-rendered frames to replay
+            (or None), and how often to update when not animating (or None to only
+            update when a message arrives)
+        """
+        # Are we animating? (If not, we only need to render when something changes).
+        animating = False
+        for transform in current_transforms:
+            if transform.is_animated():
+                animating = True
+                break
+
+        # If the output simply repeats over a fixed period, render the frames once and replay them
+        periodic_frames = None
+        if animating and render_periodic:
+            periodic_frames = self.frame_cache.get_frames(
+                current_colors, current_transforms, settings.LIGHTS_UPDATE_INTERVAL)
+            if periodic_frames and settings.LIGHTS_DRIVER_DEBUG:
+                print('      Replaying {} pre-rendered frames ({:.2f} secs)'.format(
+                    len(periodic_frames.frames), periodic_frames.period))
+
+        # If nothing is animating, the lights only change when a message arrives - unless
+        # variables are involved, in which case we still update every so often
+        static_interval = None
+        if brightness_var or any(transform.params.variable_params for transform in current_transforms):
+            static_interval = STATIC_UPDATE_INTERVAL
+
+        return animating, periodic_frames, static_interval
+
+    def apply_params(self, msg, current_transforms, current_variables):
+        """
+        Applies new params for a single transform or variable to the running
+        objects, so that they keep their state. Params for transforms that
+        aren't running (e.g. from another config) are ignored. Variables that
+        can't take the new params in place are recreated
+        :return: False if the driver needs to restart, so that transforms are
+            rebound to a recreated variable
+        """
+        params = msg.get('params', {})
+
+        transform_id = msg.get('transformId', None)
+        if transform_id is not None:
+            for transform in current_transforms:
+                if transform.transform_instance.id == transform_id:
+                    transform.set_params(params, msg.get('variableParams', {}), current_variables)
+            return True
+
+        variable = current_variables.get(msg.get('variableId', None), None)
+        if variable and not variable.set_params(params):
+            variable.close()
+            variable_instance = variable.variable_instance
+            variable_instance.params = json.dumps(params)
+            current_variables[variable_instance.id] = create_variable(variable_instance, self.color_channels)
+
+            # Compiled configs are bound to the old variable
+            self.config_cache.clear()
+            return False
 
-        return False
+        return True
+
+    @staticmethod
+    def report_timing(timer):
+        """
+        Prints the current timings, and stores them in the cache so that they
+        can be queried with the lighttiming command
+        :param pilight.timing.FrameTimer timer:
+        """
+        summary = timer.get_summary()
+        cache.set(
+            settings.DRIVER_TIMING_CACHE_ID,
+            {'time': time.time(), 'summary': summary},
+            settings.DRIVER_CACHE_EXPIRY)
+
+        print('      Timings:')
+        for line in format_summary(summary):
+            print('        ' + line)
 
     def run_simulation(self, time_step, steps):
         """
         Simulates a number of steps of applying transforms
-        Returns [[color, color, ...], [color, color, ...], ...]
+        Returns [ColorBuffer, ColorBuffer, ...]
         """
 
         # Grab the simulation parameters
@@ -273,68 +577,47 @@ class LightDriver(object):
         return result
 
     def set_colors(self, colors):
-        """Passes the given colors down to the output device for display."""
-        send_colors = []
-        for color in colors:
-            if color.a != 1.0:
-                color = color.flatten_alpha()
-
-            send_colors.append((
-                int(color.safe_corrected_r() * 255),
-                int(color.safe_corrected_g() * 255),
-                int(color.safe_corrected_b() * 255),
-                int(color.safe_corrected_w() * 255),
-            ))
-
-        self.colors_pipe.send(send_colors)
+        """Encodes the given colors, and passes them down to the output device for display."""
+        self.frames.write(self.encoder.encode(colors))
 
     def clear_lights(self):
         """Sets all of the lights to black. Useful when exiting."""
-        black = [Color(0, 0, 0)] * settings.LIGHTS_NUM_LEDS
+        black = ColorBuffer.zeros(settings.LIGHTS_NUM_LEDS)
         self.set_colors(black)
 
     def close_device(self):
         # Signal close to the device, and wait
-        self.colors_pipe.send(None)
+        self.frames.close()
         self.device.join()
 
     @staticmethod
-    def do_step(start_colors, elapsed_time, transforms, variables):
-        # Some transforms mutate colors directly, so we always start with a cloned set of colors
-        colors = [color.clone() for color in start_colors]
-
+    def do_step(start_colors, elapsed_time, transforms, variables, timer=None):
+        """
+        Computes a single frame from the given base colors
+        :param pilight.classes.ColorBuffer start_colors:
+        :param pilight.timing.FrameTimer timer: If given, records how long each variable and transform takes
+        :rtype: pilight.classes.ColorBuffer
+        """
         # Update variables
-        for variable in variables.values():
-            variable.tick_frame(elapsed_time)
+        LightDriver.tick_variables(elapsed_time, variables, timer)
 
-        # Perform each transform step
-        for transform in transforms:
-            # Tick the transform frame
-            transform.tick_frame(elapsed_time, len(colors))
-
-            # Run the transform
-            colors = transform.transform(elapsed_time, colors)
-
-        return colors
+        # Tick every transform frame, then run the optimized chain. The chain
+        # leaves the start colors untouched, and returns a fresh buffer
+        transforms.tick_frame(elapsed_time, len(start_colors), timer)
+        return transforms.transform_buffer(elapsed_time, start_colors, timer)
 
     @staticmethod
-    def pop_message():
-        """
-        Grabs the latest message from Pika, if one is waiting.
-        Returns the body of the message if present, otherwise None.
-        """
-        channel = PikaConnection.get_channel()
-        if not channel:
-            return None
+    def tick_variables(elapsed_time, variables, timer=None):
+        if timer is None:
+            for variable in variables.values():
+                variable.tick_frame(elapsed_time)
+            return
 
-        method, properties, body = channel.basic_get(settings.PIKA_QUEUE_NAME, auto_ack=True)
-        if method:
-            if body:
-                return json.loads(body.decode('utf-8'))
-            else:
-                return body
-        else:
-            return None
+        for variable_id, variable in variables.items():
+            start = timer.now()
+            variable.tick_frame(elapsed_time)
+            timer.record('Variable: {} ({})'.format(variable.variable_instance.name or variable.name, variable_id),
+                         timer.now() - start)
 
     def process_color_message(self, msg):
         """
@@ -349,11 +632,27 @@ class LightDriver(object):
         # gets safely parsed by from_hex().
         self.color_channels[msg.get('channel')[0:30]] = Color.from_hex(msg.get('color'))
 
+    def compile_config(self, current_variables, config=None):
+        """
+        Loads the given config's colors and transforms from the database
+        :rtype: pilight.light.compiled.CompiledConfig
+        """
+        return CompiledConfig(self.get_colors(config), self.get_transforms(current_variables, config))
+
+    @staticmethod
+    def get_brightness_variable(current_variables):
+        # Variables outlive restarts, so their instances may have been renamed since
+        # they were loaded - look the name up fresh on each run
+        brightness_instance = VariableInstance.objects.get_current().filter(name='Brightness').first()
+        if not brightness_instance:
+            return None
+        return current_variables.get(brightness_instance.id, None)
+
     @staticmethod
     def get_colors(config=None):
         Light.objects.reset(config)
         current_lights = Light.objects.filter(config=config).order_by('index')
-        return [light.color for light in current_lights]
+        return ColorBuffer.from_colors([light.color for light in current_lights])
 
     @staticmethod
     def get_transforms(variables, config=None):
@@ -366,7 +665,7 @@ class LightDriver(object):
             transform_obj = TRANSFORMS[transform_item.transform](transform_item, variables)
             current_transforms.append(transform_obj)
 
-        return current_transforms
+        return TransformChain(current_transforms)
 
     def get_variables(self):
         # Grab variable instances out of the database, and
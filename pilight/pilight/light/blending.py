@@ -0,0 +1,85 @@
+import numpy as np
+
+from pilight.classes import ColorBuffer
+
+A = ColorBuffer.A
+
+
+# Blending operations work on whole color arrays (as stored in ColorBuffer.data)
+# at once. The foreground may also be a single row, which is broadcast over the
+# whole background.
+
+def composite(bg, fg, opacity, mixed):
+    """
+    Composites the foreground over the background ("source over"), given
+    the result of a blend function for each light. Follows the W3C
+    compositing spec - where the background is transparent, the blend
+    function has no effect and the foreground color is used directly.
+    :param numpy.ndarray bg: Background colors
+    :param numpy.ndarray fg: Foreground (layer) colors
+    :param float opacity: Additional opacity applied to the foreground
+    :param numpy.ndarray mixed: Blend function result, for the r/g/b/w channels
+    :rtype: numpy.ndarray
+    """
+    bg_a = bg[:, A:]
+    fg_a = fg[:, A:] * opacity
+    fg_rgbw = fg[:, :A]
+
+    src = fg_rgbw + bg_a * (mixed - fg_rgbw)
+    bg_weight = bg_a * (1.0 - fg_a)
+    result_a = fg_a + bg_weight
+
+    result = np.zeros(np.broadcast(bg, fg).shape, dtype=bg.dtype)
+    np.divide(fg_a * src + bg_weight * bg[:, :A], result_a, out=result[:, :A], where=result_a > 0)
+    result[:, A:] = result_a
+    return result
+
+
+def blend_normal(bg, fg, opacity=1.0):
+    return composite(bg, fg, opacity, fg[:, :A])
+
+
+def blend_multiply(bg, fg, opacity=1.0):
+    return composite(bg, fg, opacity, bg[:, :A] * fg[:, :A])
+
+
+def blend_screen(bg, fg, opacity=1.0):
+    bg_rgbw = bg[:, :A]
+    fg_rgbw = fg[:, :A]
+    return composite(bg, fg, opacity, bg_rgbw + fg_rgbw - bg_rgbw * fg_rgbw)
+
+
+def blend_add(bg, fg, opacity=1.0):
+    # Note that this is allowed to exceed 1 - colors support HDR values
+    return composite(bg, fg, opacity, bg[:, :A] + fg[:, :A])
+
+
+def blend_max(bg, fg, opacity=1.0):
+    return composite(bg, fg, opacity, np.maximum(bg[:, :A], fg[:, :A]))
+
+
+def blend_mult_alpha(bg, fg, opacity=1.0):
+    """
+    Multiplies the background by the foreground color, scaled by the
+    foreground alpha. Always retains the background alpha
+    """
+    fg_a = fg[:, A:] * opacity
+    result = np.empty(np.broadcast(bg, fg).shape, dtype=bg.dtype)
+    result[:, :A] = bg[:, :A] * (1.0 + fg_a * (fg[:, :A] - 1.0))
+    result[:, A] = bg[:, A]
+    return result
+
+
+BLEND_MODES = {
+    'normal': blend_normal,
+    'multiply': blend_multiply,
+    'screen': blend_screen,
+    'add': blend_add,
+    'max': blend_max,
+    'alpha': blend_mult_alpha,
+}
+
+
+def get_blend_mode(name):
+    """Looks up the given blend mode, falling back to normal for unknown modes"""
+    return BLEND_MODES.get(name, blend_normal)
@@ -0,0 +1,180 @@
+import numpy as np
+
+from django.conf import settings
+
+
+class FusedScaleTransform(object):
+    """
+    Stands in for a run of consecutive scale transforms (brightness, flash,
+    etc), multiplying the colors by their combined scale in a single pass
+    """
+
+    name = 'Fused Scale'
+
+    def __init__(self, transforms):
+        self.transforms = transforms
+
+    def transform_buffer(self, time, buffer):
+        scale = 1.0
+        for transform in self.transforms:
+            scale *= transform.get_scale(time)
+
+        buffer *= scale
+        return buffer
+
+    def is_animated(self):
+        return any(transform.is_animated() for transform in self.transforms)
+
+    def get_cache_key(self):
+        return tuple(transform.get_cache_key() for transform in self.transforms)
+
+
+class TransformChain(object):
+    """
+    The ordered set of transforms that produce each frame. Rather than
+    running every transform as configured, the chain runs an optimized
+    plan:
+      - Transforms before an opaque transform are dropped, since their
+        output would be entirely overwritten
+      - Transforms that currently have no effect (identity) are skipped
+      - Consecutive scale transforms are fused into a single multiply
+    Params may be driven by variables, so the plan is checked each frame,
+    and rebuilt whenever the outcome of any of these checks changes. Every
+    transform still gets its tick_frame call, so that stateful transforms
+    stay in sync even while they're skipped.
+
+    The output of each step that isn't animated is also cached. A step is
+    only recomputed if it is dirty - either its resolved params have
+    changed, or a step before it produced new colors. For a static chain,
+    this means the frame is only computed once.
+    """
+
+    def __init__(self, transforms):
+        self.transforms = list(transforms)
+        self.plan = []
+        self.plan_labels = []
+        self.plan_key = None
+
+        # Labels for timing - numbered, as several transforms may share a name
+        self.labels = ['{}. {}'.format(index + 1, transform.name) for index, transform in enumerate(self.transforms)]
+
+        # Cached (cache key, output buffer) for each step of the plan
+        self.cache = []
+        self.input_data = None
+
+    def __iter__(self):
+        return iter(self.transforms)
+
+    def __len__(self):
+        return len(self.transforms)
+
+    def get_plan_key(self):
+        return tuple((transform.is_identity(), transform.is_opaque()) for transform in self.transforms)
+
+    def build_plan(self):
+        # Anything before the last opaque transform is dead
+        start = 0
+        for index, transform in enumerate(self.transforms):
+            if transform.is_opaque():
+                start = index
+
+        plan = []
+        scale_run = []
+        for transform in self.transforms[start:]:
+            if transform.is_identity():
+                continue
+
+            if transform.is_scale():
+                scale_run.append(transform)
+                continue
+
+            plan.extend(self.fuse(scale_run))
+            scale_run = []
+            plan.append(transform)
+
+        plan.extend(self.fuse(scale_run))
+        return plan
+
+    @staticmethod
+    def fuse(scale_run):
+        if len(scale_run) > 1:
+            return [FusedScaleTransform(scale_run)]
+        return scale_run
+
+    def get_label(self, step):
+        if isinstance(step, FusedScaleTransform):
+            return '{} ({})'.format(step.name, ', '.join(self.get_label(transform) for transform in step.transforms))
+        return self.labels[self.transforms.index(step)]
+
+    def tick_frame(self, time, num_positions, timer=None):
+        """
+        :param pilight.timing.FrameTimer timer: If given, records how long each transform takes
+        """
+        if timer is None:
+            for transform in self.transforms:
+                transform.tick_frame(time, num_positions)
+            return
+
+        for transform, label in zip(self.transforms, self.labels):
+            start = timer.now()
+            transform.tick_frame(time, num_positions)
+            timer.record('Tick: ' + label, timer.now() - start)
+
+    def transform_buffer(self, time, buffer, timer=None):
+        """
+        Runs the chain over the given colors. The given buffer is never
+        modified, and the returned buffer is always safe to modify
+        :param pilight.classes.ColorBuffer buffer:
+        :param pilight.timing.FrameTimer timer: If given, records how long each step takes to run
+        :rtype: pilight.classes.ColorBuffer
+        """
+        # Nothing is dirty unless the input or plan has changed
+        dirty = self.input_data is None or not np.array_equal(buffer.data, self.input_data)
+        if dirty:
+            self.input_data = buffer.data.copy()
+
+        plan_key = self.get_plan_key()
+        if plan_key != self.plan_key:
+            self.plan = self.build_plan()
+            self.plan_labels = [self.get_label(step) for step in self.plan]
+            self.plan_key = plan_key
+            self.cache = [None] * len(self.plan)
+            dirty = True
+
+            if settings.LIGHTS_DRIVER_DEBUG:
+                print('      Transform plan: {}'.format(
+                    ', '.join(step.name for step in self.plan) or 'none'))
+
+        # The buffer is shared with the caller (or the cache) until cloned
+        shared = True
+        for index, step in enumerate(self.plan):
+            if step.is_animated():
+                self.cache[index] = None
+                cache_key = None
+            else:
+                cache_key = step.get_cache_key()
+                if not dirty and self.cache[index] and self.cache[index][0] == cache_key:
+                    buffer = self.cache[index][1]
+                    shared = True
+                    continue
+
+            if shared:
+                buffer = buffer.clone()
+                shared = False
+
+            if timer is None:
+                buffer = step.transform_buffer(time, buffer)
+            else:
+                start = timer.now()
+                buffer = step.transform_buffer(time, buffer)
+                timer.record('Transform: ' + self.plan_labels[index], timer.now() - start)
+            dirty = True
+
+            if cache_key is not None:
+                self.cache[index] = (cache_key, buffer)
+                shared = True
+
+        if shared:
+            buffer = buffer.clone()
+
+        return buffer
@@ -0,0 +1,99 @@
+import numpy as np
+
+# Conversions between color spaces, operating on whole color arrays (as stored
+# in ColorBuffer.data). The first three columns are converted - any further
+# columns (white and alpha) are passed through untouched. Hue is expressed in
+# degrees (0 - 360), all other values are between 0 and 1.
+# Algorithms from:
+# http://www.cs.rit.edu/~ncs/color/t_convert.html
+
+
+def _hue(rgb, max_val, delta):
+    r, g, b = rgb[:, 0], rgb[:, 1], rgb[:, 2]
+
+    # Avoid dividing by zero for grays - their hue is ignored anyway
+    safe_delta = np.where(delta > 0, delta, 1.0)
+    h = np.where(
+        r == max_val,
+        (g - b) / safe_delta,
+        np.where(g == max_val, 2 + (b - r) / safe_delta, 4 + (r - g) / safe_delta))
+
+    return np.where(delta > 0, (h * 60) % 360, 0.0)
+
+
+def rgb_to_hsv(data):
+    """
+    Converts RGB values to HSV. Out of range (HDR) RGB values are clamped
+    :param numpy.ndarray data: Array of (r, g, b, ...) rows
+    :rtype: numpy.ndarray
+    """
+    rgb = np.clip(data[:, :3], 0.0, 1.0)
+    max_val = rgb.max(axis=1)
+    delta = max_val - rgb.min(axis=1)
+
+    result = np.empty_like(data)
+    result[:, 0] = _hue(rgb, max_val, delta)
+    result[:, 1] = np.where(max_val > 0, delta / np.where(max_val > 0, max_val, 1.0), 0.0)
+    result[:, 2] = max_val
+    result[:, 3:] = data[:, 3:]
+    return result
+
+
+def hsv_to_rgb(data):
+    """
+    Converts HSV values to RGB
+    :param numpy.ndarray data: Array of (h, s, v, ...) rows
+    :rtype: numpy.ndarray
+    """
+    h, s, v = data[:, 0] / 60, data[:, 1], data[:, 2]
+
+    i = np.clip(np.floor(h), 0, 5).astype(int)
+    f = h - i
+    p = v * (1 - s)
+    q = v * (1 - s * f)
+    t = v * (1 - s * (1 - f))
+
+    result = np.empty_like(data)
+    result[:, 0] = np.choose(i, (v, q, p, p, t, v))
+    result[:, 1] = np.choose(i, (t, v, v, q, p, p))
+    result[:, 2] = np.choose(i, (p, p, t, v, v, q))
+    result[:, 3:] = data[:, 3:]
+    return result
+
+
+def rgb_to_hsl(data):
+    """
+    Converts RGB values to HSL. Out of range (HDR) RGB values are clamped
+    :param numpy.ndarray data: Array of (r, g, b, ...) rows
+    :rtype: numpy.ndarray
+    """
+    rgb = np.clip(data[:, :3], 0.0, 1.0)
+    max_val = rgb.max(axis=1)
+    min_val = rgb.min(axis=1)
+    delta = max_val - min_val
+    l = (max_val + min_val) / 2
+    divisor = 1 - np.abs(2 * l - 1)
+
+    result = np.empty_like(data)
+    result[:, 0] = _hue(rgb, max_val, delta)
+    result[:, 1] = np.where(divisor > 0, delta / np.where(divisor > 0, divisor, 1.0), 0.0)
+    result[:, 2] = l
+    result[:, 3:] = data[:, 3:]
+    return result
+
+
+def hsl_to_rgb(data):
+    """
+    Converts HSL values to RGB
+    :param numpy.ndarray data: Array of (h, s, l, ...) rows
+    :rtype: numpy.ndarray
+    """
+    s, l = data[:, 1], data[:, 2]
+
+    # Convert via HSV, which shares the same hue
+    hsv = np.empty_like(data)
+    hsv[:, 0] = data[:, 0]
+    hsv[:, 2] = l + s * np.minimum(l, 1 - l)
+    hsv[:, 1] = np.where(hsv[:, 2] > 0, 2 * (1 - l / np.where(hsv[:, 2] > 0, hsv[:, 2], 1.0)), 0.0)
+    hsv[:, 3:] = data[:, 3:]
+    return hsv_to_rgb(hsv)
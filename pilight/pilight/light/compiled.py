@@ -0,0 +1,65 @@
+import collections
+
+
+class CompiledConfig(object):
+    """
+    A saved config, ready to run - its base colors, and the transform
+    chain instantiated from its transforms
+    """
+
+    def __init__(self, colors, transforms):
+        """
+        :param pilight.classes.ColorBuffer colors:
+        :param pilight.light.chain.TransformChain transforms:
+        """
+        self.colors = colors
+        self.transforms = transforms
+
+
+class ConfigCache(object):
+    """
+    Keeps the most recently run compiled configs in memory, so that
+    rotating through a playlist doesn't reload each config from the
+    database. Entries are keyed on config id and version - saving a
+    config bumps its version, so stale entries are never used. Once
+    max_size configs are cached, the least recently run is dropped.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = collections.OrderedDict()
+
+    @staticmethod
+    def get_key(config):
+        return config.id, config.version
+
+    def get_config(self, config, compile_config):
+        """
+        Returns the compiled config for the given config, compiling it
+        with compile_config(config) if it isn't cached yet
+        :param home.models.Config config:
+        :rtype: CompiledConfig
+        """
+        key = self.get_key(config)
+        compiled = self.entries.get(key)
+        if compiled is not None:
+            self.entries.move_to_end(key)
+            return compiled
+
+        compiled = compile_config(config)
+        if self.max_size > 0:
+            self.entries[key] = compiled
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+        return compiled
+
+    def __contains__(self, config):
+        return self.get_key(config) in self.entries
+
+    def invalidate(self, config_id):
+        for key in [key for key in self.entries if key[0] == config_id]:
+            del self.entries[key]
+
+    def clear(self):
+        self.entries.clear()
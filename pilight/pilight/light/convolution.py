@@ -0,0 +1,84 @@
+import functools
+
+import numpy as np
+
+# Kernels with more taps than this are applied using an FFT, rather than by
+# summing shifted copies of the colors directly
+FFT_THRESHOLD = 24
+
+
+class Kernel(object):
+    """
+    A 1-D kernel that can be convolved over a set of lights, wrapping around
+    at the ends. The weight at index center applies to the light itself;
+    weights either side apply to its neighbors.
+    """
+
+    def __init__(self, weights, center=None):
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.center = len(self.weights) // 2 if center is None else center
+        self.spectrums = {}
+
+    def __len__(self):
+        return len(self.weights)
+
+    def wrapped(self, num_positions):
+        """
+        Folds the kernel down to one weight per light - taps that wrap
+        around the strip land on the same light, so are summed together
+        """
+        offsets = (np.arange(len(self.weights)) - self.center) % num_positions
+        return np.bincount(offsets, weights=self.weights, minlength=num_positions)
+
+    def spectrum(self, num_positions):
+        # The transform of the kernel only depends on the strip length, so cache it
+        if num_positions not in self.spectrums:
+            self.spectrums[num_positions] = np.conj(np.fft.rfft(self.wrapped(num_positions)))
+        return self.spectrums[num_positions]
+
+    def apply(self, data):
+        """
+        Applies the kernel to each column of the given array:
+            result[i] = sum(weights[k] * data[(i + k - center) % len(data)])
+        :param numpy.ndarray data: Array with one row per light
+        :rtype: numpy.ndarray
+        """
+        num_positions = len(data)
+
+        if len(self.weights) > FFT_THRESHOLD:
+            spectrum = self.spectrum(num_positions)[:, np.newaxis]
+            return np.fft.irfft(np.fft.rfft(data, axis=0) * spectrum, n=num_positions, axis=0)
+
+        if len(self.weights) > num_positions:
+            weights = self.wrapped(num_positions)
+            offsets = np.arange(num_positions)
+        else:
+            weights = self.weights
+            offsets = np.arange(len(self.weights)) - self.center
+
+        result = np.zeros(data.shape, dtype=np.float64)
+        for offset, weight in zip(offsets, weights):
+            if weight != 0:
+                result += weight * np.roll(data, -offset, axis=0)
+        return result
+
+
+@functools.lru_cache(maxsize=32)
+def gaussian_kernel(sd):
+    """
+    Returns a normalized Gaussian kernel for the given standard deviation,
+    extending three standard deviations either side
+    """
+    if sd <= 0:
+        return Kernel([1.0])
+
+    # Algorithm here:
+    # http://homepages.inf.ed.ac.uk/rbf/HIPR2/gsmooth.htm (1-D case)
+    radius = int(sd * 3)
+    offsets = np.arange(-radius, radius + 1, dtype=np.float64)
+    weights = np.exp(-1 * offsets * offsets / (2 * sd * sd))
+
+    # Because the Gaussian distribution is asymptotic, if we use the
+    # raw values then the integral will be <1 - thus we want to
+    # grab the total and scale by the inverse of that amount
+    return Kernel(weights / weights.sum())
@@ -0,0 +1,59 @@
+import numpy as np
+
+from pilight.classes import ColorBuffer
+
+
+class ColorHistory(object):
+    """
+    Fixed-size ring buffer of time-stamped colors. Once full, adding a new
+    color overwrites the oldest one. Supports sampling the color at many
+    points in time at once, interpolating between the stored colors.
+    """
+
+    def __init__(self, capacity):
+        self.times = np.zeros(capacity)
+        self.colors = np.zeros((capacity, ColorBuffer.NUM_CHANNELS))
+        self.head = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def capacity(self):
+        return len(self.times)
+
+    def append(self, time, color):
+        """
+        Adds a new color - times must be added in increasing order
+        :param pilight.classes.Color color:
+        """
+        self.times[self.head] = time
+        self.colors[self.head] = color.to_tuple()
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def sample(self, times):
+        """
+        Returns the colors at each of the given times, linearly interpolating
+        between the two nearest stored colors. Times outside of the stored
+        range get the oldest or newest color.
+        :param numpy.ndarray times:
+        :rtype: numpy.ndarray
+        """
+        # Unroll the ring into chronological order
+        order = (self.head - self.count + np.arange(self.count)) % self.capacity
+        stored_times = self.times[order]
+        stored_colors = self.colors[order]
+
+        if self.count == 1:
+            return np.repeat(stored_colors, len(times), axis=0)
+
+        upper = np.clip(np.searchsorted(stored_times, times), 1, self.count - 1)
+        lower = upper - 1
+
+        span = stored_times[upper] - stored_times[lower]
+        progress = np.where(span > 0, (times - stored_times[lower]) / np.where(span > 0, span, 1.0), 1.0)
+        progress = np.clip(progress, 0.0, 1.0)[:, np.newaxis]
+
+        return stored_colors[lower] + (stored_colors[upper] - stored_colors[lower]) * progress
@@ -170,6 +170,20 @@ class TransformParams(object):
         for key, value in self.params.items():
             yield key, value
 
+    def get_cache_key(self):
+        """
+        Returns a hashable snapshot of the current param values, with any
+        variables resolved - if the key is unchanged, so are the params
+        """
+        key = []
+        for name in sorted(self.params):
+            value = getattr(self, name)
+            if isinstance(value, Color):
+                value = value.to_tuple()
+            key.append((name, value))
+
+        return tuple(key)
+
     def to_dict(self):
         params = {}
 
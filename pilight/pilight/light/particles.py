@@ -0,0 +1,85 @@
+import numpy as np
+
+# Maximum number of sparks that a pool keeps alive at once
+DEFAULT_CAPACITY = 256
+
+
+class SparkPool(object):
+    """
+    Fixed-capacity pool of "sparks" - points of light that spawn at random
+    positions, optionally move, and fade in and out over their lifetime.
+    Spark state is stored as preallocated parallel arrays, so advancing and
+    rendering all of the sparks takes a handful of array operations. When
+    the pool is full, new sparks are dropped until older ones expire, which
+    keeps the cost of each frame bounded.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, random_state=None):
+        self.random = random_state or np.random.RandomState()
+        self.last_time = 0
+
+        self.pos = np.zeros(capacity)
+        self.age = np.zeros(capacity)
+        self.duration = np.ones(capacity)
+        self.velocity = np.zeros(capacity)
+        self.radius = np.ones(capacity)
+        self.alive = np.zeros(capacity, dtype=bool)
+
+    def tick_frame(self, time, num_positions, rate, duration, velocity, radius):
+        """
+        Advances existing sparks to the given time, and spawns new sparks
+        :param float rate: Average number of sparks to spawn per second
+        :param float duration: Lifetime of new sparks (secs)
+        :param float velocity: Velocity of new sparks (lights/sec)
+        :param float radius: Falloff radius of new sparks
+        """
+        if self.last_time == 0:
+            self.last_time = time
+
+        # Advance existing sparks
+        elapsed_time = time - self.last_time
+        self.age += elapsed_time / self.duration
+        self.pos += self.velocity * elapsed_time
+        self.alive &= self.age < 1.0
+
+        # Spawn new sparks - the number of sparks appearing in a given time
+        # follows a Poisson distribution
+        num_sparks = self.random.poisson(max(0.0, elapsed_time * rate))
+        if num_sparks > 0:
+            slots = np.flatnonzero(~self.alive)[:num_sparks]
+            self.pos[slots] = self.random.randint(0, num_positions, len(slots))
+            self.age[slots] = 0.0
+            self.duration[slots] = duration
+            self.velocity[slots] = velocity
+            self.radius[slots] = radius
+            self.alive[slots] = True
+
+        # Save this time for the next iteration
+        self.last_time = time
+
+    def get_brightnesses(self, num_positions):
+        """
+        Returns the combined brightness of all sparks at each position.
+        Sparks are brightest halfway through their lifetime, and fall off
+        linearly with distance from their position
+        :rtype: numpy.ndarray
+        """
+        sparks = np.flatnonzero(self.alive & (self.radius > 0))
+        if len(sparks) == 0:
+            return np.zeros(num_positions)
+
+        pos = self.pos[sparks, np.newaxis]
+        radius = self.radius[sparks, np.newaxis]
+        strength = np.abs((self.age[sparks, np.newaxis] - 0.5) * 2)
+        min_index = (pos - radius + 1).astype(int)
+        max_index = np.ceil(pos + radius).astype(int)
+
+        # Lay out every position each spark touches as a row
+        indices = min_index + np.arange(max(1, (max_index - min_index).max()))
+
+        # TODO: Better falloff function
+        distance = np.abs(indices - pos)
+        values = np.maximum(0.0, (1.0 - (distance / radius)) - strength)
+        values[indices >= max_index] = 0.0
+
+        return np.bincount((indices % num_positions).ravel(), weights=values.ravel(), minlength=num_positions)
@@ -0,0 +1,156 @@
+import collections
+import hashlib
+import math
+from fractions import Fraction
+
+import numpy as np
+
+from pilight.classes import ColorBuffer
+
+# Durations are converted to fractions with at most this denominator, so
+# that the common period of several transforms can be found exactly
+MAX_DENOMINATOR = 1000
+
+
+def _lcm(a, b):
+    # Lowest common multiple of two positive fractions
+    if not a:
+        return b
+    return Fraction(
+        a.numerator * b.numerator // math.gcd(a.numerator, b.numerator),
+        math.gcd(a.denominator, b.denominator))
+
+
+def get_chain_period(transforms):
+    """
+    Returns the period (secs) over which the output of the whole set of
+    transforms repeats, as a Fraction - or None if the output isn't
+    a periodic function of time. Transforms with params driven by
+    variables are never considered periodic
+    :param pilight.light.chain.TransformChain transforms:
+    """
+    period = Fraction(0)
+    for transform in transforms:
+        if transform.params.variable_params:
+            return None
+
+        transform_period = transform.get_period()
+        if transform_period is None or transform_period < 0:
+            return None
+        if transform_period > 0:
+            period = _lcm(period, Fraction(transform_period).limit_denominator(MAX_DENOMINATOR))
+
+    return period
+
+
+class PeriodicFrames(object):
+    """
+    One period of pre-rendered frames, which can be replayed indefinitely.
+    Time is quantized to the nearest frame, which divide the period evenly
+    """
+
+    def __init__(self, period, frames):
+        self.period = period
+        self.frames = frames
+
+    @property
+    def nbytes(self):
+        return self.frames.nbytes
+
+    @staticmethod
+    def get_num_frames(period, interval):
+        return max(1, int(round(period / interval)))
+
+    @classmethod
+    def render(cls, start_colors, transforms, period, interval):
+        """
+        Renders a single period of the given transforms, at (roughly) the
+        given frame interval. Stored as float32, to keep the memory cost
+        down - plenty of precision for 8-bit LEDs
+        :param pilight.classes.ColorBuffer start_colors:
+        :param pilight.light.chain.TransformChain transforms:
+        """
+        num_frames = cls.get_num_frames(period, interval)
+        frames = np.empty((num_frames,) + start_colors.data.shape, dtype=np.float32)
+
+        for index in range(num_frames):
+            time = float(period * index / num_frames)
+            transforms.tick_frame(time, len(start_colors))
+            frames[index] = transforms.transform_buffer(time, start_colors).data
+
+        return cls(float(period), frames)
+
+    def get_buffer(self, time):
+        """
+        Returns the frame for the given time, as a new buffer
+        :rtype: pilight.classes.ColorBuffer
+        """
+        index = int(round(time / self.period * len(self.frames))) % len(self.frames)
+        return ColorBuffer(self.frames[index].astype(ColorBuffer.get_dtype()))
+
+
+class FrameCache(object):
+    """
+    Caches pre-rendered periods of frames for periodic configs, so that
+    the frames only need to be computed once. Least recently used periods
+    are evicted once the total size exceeds max_bytes. Periods longer
+    than max_period (secs) aren't pre-rendered, as rendering them would
+    hold up the driver for too long.
+    """
+
+    def __init__(self, max_bytes, max_period):
+        self.max_bytes = max_bytes
+        self.max_period = max_period
+        self.entries = collections.OrderedDict()
+
+    @property
+    def nbytes(self):
+        return sum(frames.nbytes for frames in self.entries.values())
+
+    @staticmethod
+    def get_key(start_colors, transforms, interval):
+        # The frames depend on the start colors, and each transform with
+        # its params and phase. Hash the colors, rather than holding on to them
+        colors_hash = hashlib.sha1(start_colors.data.tobytes()).hexdigest()
+        return (
+            colors_hash,
+            start_colors.data.shape,
+            interval,
+            tuple(
+                (type(transform).__name__, transform.get_cache_key(), transform.get_phase())
+                for transform in transforms),
+        )
+
+    def get_frames(self, start_colors, transforms, interval):
+        """
+        Returns pre-rendered frames for the given transforms, rendering
+        them if necessary. Returns None if the transforms aren't periodic,
+        the period is longer than max_period, or a single period wouldn't
+        fit in the cache
+        :param pilight.classes.ColorBuffer start_colors:
+        :param pilight.light.chain.TransformChain transforms:
+        :rtype: PeriodicFrames
+        """
+        period = get_chain_period(transforms)
+        if not period or period > self.max_period:
+            return None
+
+        num_frames = PeriodicFrames.get_num_frames(period, interval)
+        if num_frames * start_colors.data.size * np.dtype(np.float32).itemsize > self.max_bytes:
+            return None
+
+        key = self.get_key(start_colors, transforms, interval)
+        if key in self.entries:
+            frames = self.entries.pop(key)
+        else:
+            frames = PeriodicFrames.render(start_colors, transforms, period, interval)
+
+            # Evict the least recently used periods to make room
+            while self.entries and self.nbytes + frames.nbytes > self.max_bytes:
+                self.entries.popitem(last=False)
+
+        self.entries[key] = frames
+        return frames
+
+    def clear(self):
+        self.entries.clear()
@@ -1,16 +1,17 @@
-import collections
 import json
 import math
-import random
 
-from django.conf import settings
+import numpy as np
 
 from home.models import load_variable_params
-from pilight.classes import Color
+from pilight.classes import Color, ColorBuffer
+from pilight.light.blending import blend_normal, get_blend_mode
+from pilight.light.colorspace import hsv_to_rgb, rgb_to_hsv
+from pilight.light.convolution import gaussian_kernel
+from pilight.light.history import ColorHistory
+from pilight.light.particles import SparkPool
 from pilight.light.params import BooleanParam, LongParam, FloatParam, PercentParam, \
-    ColorParam, StringParam, ParamsDef, transform_params_from_dict
-
-TimedColor = collections.namedtuple('TimedColor', ('time', 'color'))
+    ColorParam, StringParam, ParamsDef, transform_params_from_dict, transform_variable_params_from_dict
 
 
 class TransformBase(object):
@@ -30,13 +31,39 @@ class TransformBase(object):
 
         self.color_channel = None
 
+    def set_params(self, params, variable_params, variables):
+        """
+        Replaces the transform's params in place, keeping any other state
+        (such as sparks or scroll offsets) - used to apply changes made in
+        the UI without rebuilding the transform
+        :param dict params: Param values, as stored on the TransformInstance
+        :param dict variable_params: Variable params for each param name, as sent by the UI
+        """
+        self.params = transform_params_from_dict(
+            params,
+            transform_variable_params_from_dict(variable_params, self.params_def),
+            self.params_def, variables)
+
     def transform(self, time, input_colors):
         """
-        Performs the actual color transformation for this transform step
+        Performs the actual color transformation for this transform step.
+        Legacy per-Color version - prefer overriding transform_buffer
         :var list[pilight.classes.Color] input_colors:
         """
         pass
 
+    def transform_buffer(self, time, buffer):
+        """
+        Performs the actual color transformation for this transform step,
+        operating on the whole frame at once. May modify the buffer in place.
+        The default implementation falls back to the per-Color transform()
+        method, so that older transforms keep working
+        :var pilight.classes.ColorBuffer buffer:
+        :rtype: pilight.classes.ColorBuffer
+        """
+        colors = self.transform(time, buffer.to_colors())
+        return ColorBuffer.from_colors(colors, dtype=buffer.data.dtype)
+
     def tick_frame(self, time, num_positions):
         """
         Called once at the beginning of each frame - gives the transform
@@ -53,6 +80,65 @@ class TransformBase(object):
         """
         return True
 
+    def get_cache_key(self):
+        """
+        Used by the driver to optimize - the output of a transform that is
+        not animated is cached, and only recomputed when its input colors or
+        this key change. Transforms whose output depends on anything other
+        than their params should override this
+        """
+        return self.params.get_cache_key()
+
+    def get_period(self):
+        """
+        Used by the driver to optimize - returns the period (secs) after
+        which the transform's output repeats, assuming its params don't
+        change. Returns 0 if the output doesn't depend on time at all, or
+        None if it isn't a periodic function of time
+        """
+        return None if self.is_animated() else 0
+
+    def get_phase(self):
+        """
+        Used by the driver to optimize - transforms whose output depends on
+        state built up over previous frames (not just the current time)
+        return a value identifying that state, so that pre-rendered frames
+        are only replayed from the same phase. None for stateless transforms
+        """
+        return None
+
+    def is_identity(self):
+        """
+        Used by the driver to optimize - returns True if the transform
+        currently has no effect on the colors (given its current params),
+        in which case it is skipped. Still receives tick_frame calls
+        """
+        return False
+
+    def is_opaque(self):
+        """
+        Used by the driver to optimize - returns True if the transform
+        currently replaces every color entirely, in which case all of the
+        transforms before it are skipped
+        """
+        return False
+
+    def is_scale(self):
+        """
+        Used by the driver to optimize - transforms that simply scale the
+        brightness of every light by the same amount return True, and
+        implement get_scale. Consecutive scale transforms are fused
+        together into a single pass
+        """
+        return False
+
+    def get_scale(self, time):
+        """
+        Returns the amount that a scale transform multiplies each light
+        by at the given time
+        """
+        return 1.0
+
 
 class LayerBase(TransformBase):
     """
@@ -65,7 +151,14 @@ class LayerBase(TransformBase):
     def __init__(self, transform_instance, variables):
         super(LayerBase, self).__init__(transform_instance, variables)
 
+        # Resolve the blend mode up front, rather than on every frame
+        self.blend_mode = self.params.blend_mode
+        self.blend = get_blend_mode(self.blend_mode)
+
+    def set_params(self, params, variable_params, variables):
+        super(LayerBase, self).set_params(params, variable_params, variables)
         self.blend_mode = self.params.blend_mode
+        self.blend = get_blend_mode(self.blend_mode)
 
     params_def = ParamsDef(
         opacity=PercentParam(
@@ -76,43 +169,38 @@ class LayerBase(TransformBase):
         blend_mode=StringParam(
             'Blend Mode',
             'normal',
-            'Blend mode (valid: "multiply" or "normal")',
+            'Blend mode (valid: "normal", "multiply", "screen", "add", "max" or "alpha")',
         ))
 
-    def transform(self, time, input_colors):
+    def transform_buffer(self, time, buffer):
         """
-        Performs blending of the layer's color with the existing color in
-        the given position, using opacity and blending modes. Should not be
-        overridden by inherited classes - override get_color instead.
+        Performs blending of the layer's colors with the existing colors,
+        using opacity and blending modes. Should not be overridden by
+        inherited classes - override get_buffer instead.
         """
 
-        opacity = self.params.opacity
-        total = len(input_colors)
-        colors = self.get_colors(time, total)
-        for index, input_color in enumerate(input_colors):
-            # Grab the color from the layer and apply the opacity
-            color = colors[index].clone()
-            color.a *= opacity
-
-            # Perform blending with the given blend mode
-            # Currently support "multiply" and "normal" modes - normal being the default
-            # if an unknown mode gets passed in
-            if self.blend_mode == 'multiply':
-                # TODO: Actually implement multiplicative blending
-                color = Color.blend_mult(input_color, color)
-            elif self.blend_mode == 'alpha':
-                color = Color.blend_mult_alpha(input_color, color)
-            else:
-                color = Color.blend_normal(input_color, color)
+        layer = self.get_buffer(time, len(buffer))
+        buffer.data = self.blend(buffer.data, layer.data, self.params.opacity)
+        return buffer
 
-            input_colors[index] = color
+    def is_identity(self):
+        return self.params.opacity == 0
 
-        return input_colors
+    def get_buffer(self, time, num_positions):
+        """
+        Main method that inherited classes should implement - returns a
+        ColorBuffer with the layer's color for each position. The returned
+        buffer is not modified, so it is safe to return cached state.
+        The default implementation wraps the older get_colors() method
+        :rtype: pilight.classes.ColorBuffer
+        """
+        return ColorBuffer.from_colors(self.get_colors(time, num_positions))
 
     def get_colors(self, time, num_positions):
         """
-        Main method that inherited classes should implement - returns a
-        color for the given position
+        Legacy version of get_buffer - returns a list with a color for
+        each position
+        :rtype: list[pilight.classes.Color]
         """
         pass
 
@@ -132,26 +220,18 @@ class BrightnessTransform(TransformBase):
     def is_animated(self):
         return False
 
-    def transform(self, time, input_colors):
-        brightness = self.params.brightness
-        for index in range(len(input_colors)):
-            input_colors[index] *= brightness
-
-        return input_colors
+    def is_identity(self):
+        return self.params.brightness == 1.0
 
+    def is_scale(self):
+        return True
 
-class Spark(object):
-    def __init__(self, pos, duration, age=0.0, velocity=0.0, radius=1):
-        self.pos = pos
-        self.duration = duration
-        self.age = age
-        self.velocity = velocity
-        self.radius = radius
+    def get_scale(self, time):
+        return self.params.brightness
 
-    def tick_frame(self, time):
-        self.age += time / self.duration
-        self.pos += self.velocity * time
-        return self.age < 1.0
+    def transform_buffer(self, time, buffer):
+        buffer *= self.get_scale(time)
+        return buffer
 
 
 class BurstTransform(TransformBase):
@@ -184,60 +264,24 @@ class BurstTransform(TransformBase):
     def __init__(self, transform_instance, variables):
         super(BurstTransform, self).__init__(transform_instance, variables)
 
-        self.sparks = []
-        self.brightnesses = []
-        self.last_time = 0
+        self.sparks = SparkPool()
+        self.brightnesses = np.zeros(0)
 
     def tick_frame(self, time, num_positions):
-        if self.last_time == 0:
-            self.last_time = time
-
-        # Advance existing sparks
-        elapsed_time = time - self.last_time
-        new_sparks = []
-        for spark in self.sparks:
-            if spark.tick_frame(elapsed_time):
-                new_sparks.append(spark)
-
-        self.sparks = new_sparks
-
-        # Determine probability of making a spark
-        chance = elapsed_time * self.params.burst_rate / num_positions
-
-        # Spawn new sparks
-        for i in range(num_positions):
-            if random.random() < chance:
-                self.sparks.append(Spark(
-                    pos=i,
-                    duration=self.params.burst_duration,
-                    age=0.0,
-                    velocity=self.params.velocity,
-                    radius=self.params.burst_radius,
-                ))
-
-        # Determine brightnesses
-        self.brightnesses = [0.0] * num_positions
-
-        for spark in self.sparks:
-            spark_strength = abs((spark.age - 0.5) * 2)
-            min_index = int(spark.pos - spark.radius + 1)
-            max_index = int(math.ceil(spark.pos + spark.radius))
-
-            for index in range(min_index, max_index):
-                # TODO: Better falloff function
-                distance = abs(float(index) - float(spark.pos))
-                self.brightnesses[index % num_positions] += max(
-                    0.0, (1.0 - (distance / float(spark.radius))) - spark_strength)
-
-        # Save this time for the next iteration
-        self.last_time = time
-
-    def transform(self, time, input_colors):
+        self.sparks.tick_frame(
+            time,
+            num_positions,
+            rate=self.params.burst_rate,
+            duration=self.params.burst_duration,
+            velocity=self.params.velocity,
+            radius=self.params.burst_radius,
+        )
+        self.brightnesses = self.sparks.get_brightnesses(num_positions)
+
+    def transform_buffer(self, time, buffer):
         # Apply the saved brightnesses
-        for index, color in enumerate(input_colors):
-            color.a = getattr(color, 'a', 1.0) * self.brightnesses[index]
-
-        return input_colors
+        buffer.alpha *= self.brightnesses
+        return buffer
 
 
 class ColorLayer(LayerBase):
@@ -252,8 +296,15 @@ class ColorLayer(LayerBase):
         **LayerBase.params_def.params_def.copy())
     display_order = 300
 
-    def get_colors(self, time, num_positions):
-        return [self.params.color] * num_positions
+    def get_buffer(self, time, num_positions):
+        return ColorBuffer.from_color(self.params.color, num_positions)
+
+    def get_period(self):
+        return 0
+
+    def is_opaque(self):
+        # Fully covers whatever is underneath
+        return self.blend is blend_normal and self.params.opacity * getattr(self.params.color, 'a', 1.0) == 1.0
 
 
 class ColorBurstLayer(LayerBase):
@@ -291,63 +342,24 @@ class ColorBurstLayer(LayerBase):
     def __init__(self, transform_instance, variables):
         super(ColorBurstLayer, self).__init__(transform_instance, variables)
 
-        self.sparks = []
-        self.brightnesses = []
-        self.last_time = 0
+        self.sparks = SparkPool()
+        self.brightnesses = np.zeros(0)
 
     def tick_frame(self, time, num_positions):
-        if self.last_time == 0:
-            self.last_time = time
-
-        # Advance existing sparks
-        elapsed_time = time - self.last_time
-        new_sparks = []
-        for spark in self.sparks:
-            if spark.tick_frame(elapsed_time):
-                new_sparks.append(spark)
-
-        self.sparks = new_sparks
-
-        # Determine probability of making a spark
-        chance = elapsed_time * self.params.burst_rate / num_positions
-
-        # Spawn new sparks
-        for i in range(num_positions):
-            if random.random() < chance:
-                self.sparks.append(Spark(
-                    pos=i,
-                    duration=self.params.burst_duration,
-                    age=0.0,
-                    velocity=self.params.velocity,
-                    radius=self.params.burst_radius,
-                ))
-
-        # Determine brightnesses
-        self.brightnesses = [0.0] * num_positions
-
-        for spark in self.sparks:
-            spark_strength = abs((spark.age - 0.5) * 2)
-            min_index = int(spark.pos - spark.radius + 1)
-            max_index = int(math.ceil(spark.pos + spark.radius))
-
-            for index in range(min_index, max_index):
-                # TODO: Better falloff function
-                distance = abs(float(index) - float(spark.pos))
-                self.brightnesses[index % num_positions] += max(
-                    0.0, (1.0 - (distance / float(spark.radius))) - spark_strength)
-
-        # Save this time for the next iteration
-        self.last_time = time
-
-    def get_colors(self, time, num_positions):
+        self.sparks.tick_frame(
+            time,
+            num_positions,
+            rate=self.params.burst_rate,
+            duration=self.params.burst_duration,
+            velocity=self.params.velocity,
+            radius=self.params.burst_radius,
+        )
+        self.brightnesses = self.sparks.get_brightnesses(num_positions)
+
+    def get_buffer(self, time, num_positions):
         # Apply the saved brightnesses
-        result = []
-        base_color = self.params.color
-        for idx in range(num_positions):
-            color = base_color.clone()
-            color.a = self.brightnesses[idx]
-            result.append(color)
-
+        result = ColorBuffer.from_color(self.params.color, num_positions)
+        result.alpha = self.brightnesses
         return result
 
 
@@ -405,8 +417,11 @@ class ColorFlashTransform(LayerBase):
         # Compute value based on progress and start/end vals
         self.color = flash_start_color * (1 - progress) + flash_end_color * progress
 
-    def get_colors(self, time, num_positions):
-        return [self.color] * num_positions
+    def get_buffer(self, time, num_positions):
+        return ColorBuffer.from_color(self.color, num_positions)
+
+    def get_period(self):
+        return self.params.duration
 
 
 class FastBlur(TransformBase):
@@ -430,43 +445,54 @@ class FastBlur(TransformBase):
         super(FastBlur, self).__init__(transform_instance, variables)
 
         self.boxes = []
+        self.box_indices = []
+        self.boxes_key = None
 
     def is_animated(self):
         return False
 
+    def is_identity(self):
+        return self.params.passes <= 0
+
     def tick_frame(self, time, num_positions):
-        self.boxes = self.boxes_for_gauss(self.params.standarddev, self.params.passes)
+        # Params may be driven by variables, so check them each frame - but only
+        # recompute the boxes when something has actually changed
+        boxes_key = (self.params.standarddev, self.params.passes, num_positions)
+        if boxes_key == self.boxes_key:
+            return
+
+        self.boxes = self.boxes_for_gauss(self.params.standarddev, self.params.passes) \
+            if self.params.passes > 0 else []
+        self.box_indices = []
+        for box in self.boxes:
+            r = min(int((box - 1) / 2), num_positions)
+            # Each box pass reads the lights wrapped around both ends - plus one
+            # extra light on the left, so that the running sums start from zero
+            self.box_indices.append(np.arange(-r - 1, num_positions + r) % num_positions)
+        self.boxes_key = boxes_key
 
     # Adapted from:
     #   http://blog.ivank.net/fastest-gaussian-blur.html
     #   http://elynxsdk.free.fr/ext-docs/Blur/Fast_box_blur.pdf
     # Performs several box filter passes to approximate a Gaussian blur
-    def transform(self, time, input_colors):
-        result = input_colors
-        num_colors = len(result)
+    def transform_buffer(self, time, buffer):
+        # Without any passes, the colors are left as they are
+        if not self.box_indices:
+            return buffer
 
-        for box in self.boxes:
-            next_colors = []
-
-            r = min(int((box - 1) / 2), num_colors)
-            divisor = 1.0 / (2 * r + 1)
-
-            left_idx = -r-1
-            right_idx = r
+        num_colors = len(buffer)
+        result = buffer.flatten_alpha().rgbw
 
-            val = Color(0, 0, 0)
-            for i in range(left_idx, right_idx):
-                val += result[i]
+        for indices in self.box_indices:
+            # Each output is the difference between two running sums, so the cost
+            # of a pass doesn't depend on the box size
+            window = len(indices) - num_colors
+            sums = np.cumsum(result[indices], axis=0, dtype=np.float64)
+            result = (sums[window:] - sums[:-window]) / window
 
-            for _ in range(num_colors):
-                val += result[right_idx % num_colors] - result[left_idx % num_colors]
-                right_idx += 1
-                left_idx += 1
-                next_colors.append(val * divisor)
-
-            result = next_colors
-
-        return result
+        buffer.rgbw = result
+        buffer.alpha = 1.0
+        return buffer
 
     @staticmethod
     def boxes_for_gauss(sd, n):
@@ -507,7 +533,20 @@ class FlashTransform(TransformBase):
         ))
     display_order = 10
 
-    def transform(self, time, input_colors):
+    def is_identity(self):
+        return self.params.start_value == 1.0 and self.params.end_value == 1.0
+
+    def get_period(self):
+        return self.params.duration
+
+    def is_scale(self):
+        return True
+
+    def transform_buffer(self, time, buffer):
+        buffer *= self.get_scale(time)
+        return buffer
+
+    def get_scale(self, time):
         # Transform time/rate into a percentage for the current oscillation
         duration = self.params.duration
         progress = float(time) / float(duration) - int(time / duration)
@@ -523,19 +562,37 @@ class FlashTransform(TransformBase):
         progress = (progress + 1) / 2
 
         # Compute value based on progress and start/end vals
-        scale = (1 - progress) * self.params.start_value + progress * self.params.end_value
+        return (1 - progress) * self.params.start_value + progress * self.params.end_value
+
+
+class KernelTransform(TransformBase):
+    """
+    Specialized type of transform - convolves the colors with a kernel
+    (see pilight.light.convolution), wrapping around the ends of the
+    lights. Inherited classes implement get_kernel.
+    """
+
+    def is_animated(self):
+        return False
 
-        for index in range(len(input_colors)):
-            input_colors[index] *= scale
+    def transform_buffer(self, time, buffer):
+        buffer.rgbw = self.get_kernel().apply(buffer.flatten_alpha().rgbw)
+        buffer.alpha = 1.0
+        return buffer
 
-        return input_colors
+    def get_kernel(self):
+        """
+        Main method that inherited classes should implement - returns the
+        pilight.light.convolution.Kernel to apply. Kernels are cached, so
+        this should avoid building a new kernel on every frame
+        """
+        pass
 
 
-# TODO: Remove? FastBlur is a good approximation, and significantly faster!
-class GaussianBlurTransform(TransformBase):
+class GaussianBlurTransform(KernelTransform):
     name = 'Gaussian Blur'
     description = 'Applies a gaussian blur across the entire set of lights, with the given standard ' + \
-                  'deviation. Note that this is an expensive transform, use with care.'
+                  'deviation.'
     params_def = ParamsDef(
         standarddev=FloatParam(
             'Standard Deviation',
@@ -544,42 +601,8 @@ class GaussianBlurTransform(TransformBase):
         ))
     display_order = 140
 
-    def is_animated(self):
-        return False
-
-    @staticmethod
-    def gaussian(x, sd):
-        sd = float(sd)
-        x = float(x)
-        return (1 / (math.sqrt(2 * math.pi) * sd)) * math.exp(-1 * x * x / (2 * sd * sd))
-
-    def transform(self, time, input_colors):
-        # Algorithm here:
-        # http://homepages.inf.ed.ac.uk/rbf/HIPR2/gsmooth.htm (1-D case)
-        sd = self.params.standarddev
-
-        radius = int(sd * 3)
-        # Because the Gaussian distribution is asymptotic, if we use the
-        # raw values then the integral will be <1 - thus we want to
-        # grab the total and scale by the inverse of that amount
-        gaussians = {}
-        total = 0
-        for offset in range(-radius, radius):
-            gaussians[offset] = self.gaussian(offset, sd)
-            total += gaussians[offset]
-
-        colors = []
-        num_colors = len(input_colors)
-        for index in range(len(input_colors)):
-            color = Color(0.0, 0.0, 0.0)
-
-            for offset in range(-radius, radius):
-                current_position = (offset + index) % num_colors
-                color += input_colors[current_position] * (gaussians[offset] / total)
-
-            colors.append(color)
-
-        return colors
+    def get_kernel(self):
+        return gaussian_kernel(float(self.params.standarddev))
 
 
 class NoiseLayer(LayerBase):
@@ -619,20 +642,22 @@ class NoiseLayer(LayerBase):
     def __init__(self, transform_instance, variables):
         super(NoiseLayer, self).__init__(transform_instance, variables)
 
+        # Replace (or seed) this to get a repeatable noise pattern
+        self.random = np.random.RandomState()
         self.last_time = -1
         self.progress = 0.0
-        self.current_colors = []
-        self.next_colors = []
+        self.current_colors = ColorBuffer.zeros(0)
+        self.next_colors = ColorBuffer.zeros(0)
 
     def get_random_colors(self, length):
-        colors = []
-        for i in range(length):
-            colors.append(Color(
-                1.0 - random.random() * self.params.red_strength,
-                1.0 - random.random() * self.params.green_strength,
-                1.0 - random.random() * self.params.blue_strength,
-                1.0 - random.random() * self.params.white_strength,
-            ))
+        strengths = (
+            self.params.red_strength,
+            self.params.green_strength,
+            self.params.blue_strength,
+            self.params.white_strength,
+        )
+        colors = ColorBuffer.zeros(length)
+        colors.rgbw = 1.0 - self.random.random_sample((length, 4)) * strengths
         return colors
 
     def tick_frame(self, time, num_positions):
@@ -650,12 +675,9 @@ class NoiseLayer(LayerBase):
 
         self.progress = (float(time) - float(self.last_time)) / self.params.duration
 
-    def get_colors(self, time, num_positions):
-        colors = []
-        for index in range(num_positions):
-            colors.append(self.next_colors[index] * self.progress + self.current_colors[index] * (1 - self.progress))
-
-        return colors
+    def get_buffer(self, time, num_positions):
+        current = self.current_colors.data
+        return ColorBuffer(current + (self.next_colors.data - current) * self.progress)
 
 
 class PixelateTransform(TransformBase):
@@ -670,27 +692,30 @@ class PixelateTransform(TransformBase):
         ))
     display_order = 12
 
-    def transform(self, time, input_colors):
-        result = []
-        block_size = self.params.block_size
+    def get_period(self):
+        return 0
 
-        next_color = Color(0, 0, 0)
-        num_colors = 0
-        for input_color in input_colors:
-            next_color += input_color
-            num_colors += 1
+    def transform_buffer(self, time, buffer):
+        num_colors = len(buffer)
+        block_size = int(self.params.block_size)
+        if block_size < 1 or block_size > num_colors:
+            # The whole set of lights becomes one block
+            block_size = num_colors
 
-            if num_colors == block_size:
-                next_color /= block_size
-                result.extend([next_color] * block_size)
-                next_color = Color(0, 0, 0)
-                num_colors = 0
+        # Averaging flattens the alpha
+        colors = buffer.flatten_alpha().data
+        num_blocks, remainder = divmod(num_colors, block_size)
+        full = num_blocks * block_size
 
-        if num_colors > 0:
-            next_color /= num_colors
-            result.extend([next_color] * num_colors)
+        block_colors = colors[:full].reshape(num_blocks, block_size, -1).mean(axis=1)
+        block_sizes = np.full(num_blocks, block_size)
+        if remainder > 0:
+            # Partial block at the end
+            block_colors = np.vstack((block_colors, colors[full:].mean(axis=0)))
+            block_sizes = np.append(block_sizes, remainder)
 
-        return result
+        buffer.data = np.repeat(block_colors, block_sizes, axis=0)
+        return buffer
 
 
 class RainbowLayer(LayerBase):
@@ -707,20 +732,25 @@ class RainbowLayer(LayerBase):
 
     def __init__(self, transform_instance, variables):
         super(RainbowLayer, self).__init__(transform_instance, variables)
-        self.colors = []
+        self.colors = ColorBuffer.zeros(0)
         self.last_saturation = 0
 
     def tick_frame(self, time, num_positions):
         if self.params.saturation != self.last_saturation or len(self.colors) != num_positions:
             # Need to re-generate the rainbow colors
-            self.colors = []
-            for index in range(num_positions):
-                self.colors.append(Color.from_hsv(360.0 * float(index) / float(num_positions), self.params.saturation, 1.0))
+            hsv = ColorBuffer.zeros(num_positions)
+            hsv.data[:, 0] = 360.0 * np.arange(num_positions) / float(num_positions)
+            hsv.data[:, 1] = self.params.saturation
+            hsv.data[:, 2] = 1.0
+            self.colors = ColorBuffer(hsv_to_rgb(hsv.data))
             self.last_saturation = self.params.saturation
 
-    def get_colors(self, time, num_positions):
+    def get_buffer(self, time, num_positions):
         return self.colors
 
+    def get_period(self):
+        return 0
+
 
 class RotateHueTransform(TransformBase):
     name = 'Rotate Hue'
@@ -733,22 +763,23 @@ class RotateHueTransform(TransformBase):
         ))
     display_order = 2
 
-    def transform(self, time, input_colors):
+    def get_period(self):
+        return self.params.duration
+
+    def transform_buffer(self, time, buffer):
         # Transform time/rate into a percentage
         duration = self.params.duration
         progress = float(time) / float(duration) - int(time / duration)
 
-        for index, input_color in enumerate(input_colors):
-            # Get color as HSV
-            h, s, v, w, a = input_color.to_hsv()
+        # Get colors as HSV
+        hsv = rgb_to_hsv(buffer.data)
 
-            # Rotate H by given amount
-            h = (h + progress * 360) % 360
+        # Rotate H by given amount
+        hsv[:, 0] = (hsv[:, 0] + progress * 360) % 360
 
-            # Transform HSV back to RGB and return
-            input_colors[index] = Color.from_hsv(h, s, v, w, a)
-
-        return input_colors
+        # Transform HSV back to RGB
+        buffer.data = hsv_to_rgb(hsv)
+        return buffer
 
 
 class ScrollTransform(TransformBase):
@@ -775,10 +806,21 @@ class ScrollTransform(TransformBase):
     def __init__(self, transform_instance, variables):
         super(ScrollTransform, self).__init__(transform_instance, variables)
         self.last_time = 0.0
-        self.offset = 0.0
+        # How far through a full scroll the lights are (0-1)
+        self.position = 0.0
 
-    def transform(self, time, input_colors):
-        total = len(input_colors)
+    def get_period(self):
+        return self.params.duration
+
+    def get_phase(self):
+        # Where the scroll would have been at time zero, had it always run
+        # at the current speed. This stays the same as the scroll runs, and
+        # only moves when the duration or direction changes
+        rate = (-1.0 if self.params.reverse else 1.0) / self.params.duration
+        return round((self.position - self.last_time * rate) % 1.0, 6) % 1.0
+
+    def transform_buffer(self, time, buffer):
+        total = len(buffer)
 
         # Transform time/rate into a percentage
         duration = self.params.duration
@@ -787,27 +829,25 @@ class ScrollTransform(TransformBase):
 
         # Calculate offset to source from
         if self.params.reverse:
-            self.offset -= progress * total
+            self.position -= progress
         else:
-            self.offset += progress * total
+            self.position += progress
 
-        self.offset %= total
+        self.position %= 1.0
 
-        colors = []
-        blend = self.params.blend
+        offset = self.position * total
+        shift = int(offset)
+        percent = offset % 1
 
-        for index, input_color in enumerate(input_colors):
-            source_position = (int(self.offset) + index) % total
-            percent = self.offset % 1
+        if percent == 0 or not self.params.blend:
+            buffer.data = np.roll(buffer.data, -shift, axis=0)
+            return buffer
 
-            if percent == 0 or not blend:
-                colors.append(input_colors[source_position])
-                continue
-
-            next_position = (source_position + 1) % total
-            colors.append(input_colors[source_position] * (1 - percent) + input_colors[next_position] * percent)
-
-        return colors
+        # Blend each light with the next one along - blending flattens the alpha
+        source = np.roll(buffer.flatten_alpha().data, -shift, axis=0)
+        buffer.data = source * (1 - percent) + np.roll(source, -1, axis=0) * percent
+        buffer.alpha = 1.0
+        return buffer
 
 
 class SpectrumFlowLayer(LayerBase):
@@ -850,19 +890,18 @@ class SpectrumFlowLayer(LayerBase):
 
     def __init__(self, transform_instance, variables):
         super(SpectrumFlowLayer, self).__init__(transform_instance, variables)
-        self.colors = collections.deque()
-        self.display_colors = []
+        self.colors = ColorHistory(0)
         self.last_time = 0
 
     def tick_frame(self, time, num_positions):
-        duration = self.params.duration
-
-        # Drop colors that are no longer relevant - look ahead by one
-        while len(self.colors) > 1 and time - self.colors[1].time > duration:
-            self.colors.pop()
+        # We never add colors more frequently than the "interval" between two
+        # lights, so there's no need to remember many more colors than there are
+        # lights - older colors drop off the end of the history
+        if self.colors.capacity != num_positions + 2:
+            self.colors = ColorHistory(num_positions + 2)
 
         # Don't update more frequently than the "interval" between two lights
-        min_update_time = float(self.params.duration) / settings.LIGHTS_NUM_LEDS
+        min_update_time = float(self.params.duration) / num_positions
         if len(self.colors) > 0 and time - self.last_time < min_update_time:
             return
 
@@ -875,40 +914,13 @@ class SpectrumFlowLayer(LayerBase):
             value = (value - 0.5) * 2.0
             color = self.params.mid_color * (1.0 - value) + self.params.high_color * value
 
-        self.colors.appendleft(TimedColor(
-            time=time,
-            color=color,
-        ))
+        self.colors.append(time, color)
         self.last_time = time
 
-    def get_colors(self, time, num_positions):
-        if len(self.colors) == 1:
-            return [self.colors[0].color.clone()] * num_positions
-
-        colors = []
-        curr_color = self.colors[0]
-        next_color = self.colors[1]
-        next_index = 2
-
-        duration = self.params.duration
-        for i in range(num_positions):
-            light_time = time - i * duration / num_positions
-
-            # Walk input colors
-            while light_time <= next_color.time and next_index < len(self.colors):
-                curr_color = next_color
-                next_color = self.colors[next_index]
-                next_index += 1
-
-            # Interpolate between colors
-            progress = min(1.0, max(0.0, (
-                (curr_color.time - light_time) / (curr_color.time - next_color.time)
-            )))
-
-            color = curr_color.color * (1.0 - progress) + next_color.color * progress
-            colors.append(color)
-
-        return colors
+    def get_buffer(self, time, num_positions):
+        # Each light shows the color from a point further back in time
+        light_times = time - np.arange(num_positions) * (self.params.duration / float(num_positions))
+        return ColorBuffer(self.colors.sample(light_times))
 
 
 class StrobeTransform(TransformBase):
@@ -944,11 +956,15 @@ class StrobeTransform(TransformBase):
                 self.state_on = True
                 self.frames = 0
 
-    def transform(self, time, input_colors):
-        if self.state_on:
-            return input_colors
-        else:
-            return [Color(0, 0, 0)] * len(input_colors)
+    def is_scale(self):
+        return True
+
+    def get_scale(self, time):
+        return 1.0 if self.state_on else 0.0
+
+    def transform_buffer(self, time, buffer):
+        buffer *= self.get_scale(time)
+        return buffer
 
 
 class CrushColorTransform(TransformBase):
@@ -984,22 +1000,20 @@ class CrushColorTransform(TransformBase):
     def is_animated(self):
         return True
 
-    def transform(self, time, input_colors):
+    def get_period(self):
+        # Only changes with variables
+        return 0
+
+    def transform_buffer(self, time, buffer):
         strength = self.params.strength
-        red_max = self.params.red_max
-        green_max = self.params.green_max
-        blue_max = self.params.blue_max
-
-        for index, color in enumerate(input_colors):
-            input_colors[index] = Color(
-                min(color.r * strength, red_max),
-                min(color.g * strength, green_max),
-                min(color.b * strength, blue_max),
-                # Don't impact white
-                color.w,
-                color.a)
-
-        return input_colors
+        data = buffer.data
+
+        # Don't impact white
+        data[:, ColorBuffer.R] = np.minimum(data[:, ColorBuffer.R] * strength, self.params.red_max)
+        data[:, ColorBuffer.G] = np.minimum(data[:, ColorBuffer.G] * strength, self.params.green_max)
+        data[:, ColorBuffer.B] = np.minimum(data[:, ColorBuffer.B] * strength, self.params.blue_max)
+
+        return buffer
 
 
 TRANSFORMS = {
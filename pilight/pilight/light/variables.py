@@ -29,6 +29,17 @@ class Variable(object):
             json.loads(variable_instance.params or '{}'),
             self.params_def)
 
+    def set_params(self, params):
+        """
+        Replaces the variable's params in place. Returns False if the new
+        params can't be applied to the running variable, in which case it
+        must be recreated
+        :param dict params: Param values, as stored on the VariableInstance
+        :rtype: bool
+        """
+        self.params = variable_params_from_dict(params, self.params_def)
+        return True
+
     def tick_frame(self, time):
         pass
 
@@ -209,6 +220,16 @@ class AudioVariable(Variable):
 
         self.audio_compute_process.start()
 
+    def set_params(self, params):
+        old_params = self.params
+        super(AudioVariable, self).set_params(params)
+
+        # The audio process only reads these when it starts
+        if not settings.ENABLE_AUDIO_VAR:
+            return True
+        return (self.params.audio_duration == old_params.audio_duration and
+                self.params.lpf_freq == old_params.lpf_freq)
+
     def tick_frame(self, time):
         if not settings.ENABLE_AUDIO_VAR:
             return 1.0
@@ -0,0 +1,123 @@
+import cProfile
+import datetime
+import io
+import os
+import pstats
+import time
+
+# Methods through which the driver calls into transforms and variables
+ENTRY_POINTS = ('tick_frame', 'transform_buffer', 'get_buffer', 'transform', 'get_colors', 'get_scale', 'get_value')
+
+# Number of functions to include in the plain pstats listing
+NUM_FUNCTIONS = 40
+
+
+def get_code_key(func):
+    code = func.__code__
+    return code.co_filename, code.co_firstlineno, code.co_name
+
+
+class DriverProfiler(object):
+    """
+    Captures a cProfile of the running driver for a fixed amount of time.
+    The profiler is only enabled while a capture is running, so the frame
+    loop is unaffected otherwise. Results are written to output_dir, both
+    as raw stats (.prof, for use with pstats or snakeviz) and as a text
+    summary (.txt) with the time attributed to each transform and
+    variable class.
+    """
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.profile = None
+        self.end_time = None
+
+    @property
+    def running(self):
+        return self.profile is not None
+
+    def start(self, duration):
+        if self.running:
+            print('    Already profiling')
+            return
+
+        print('    Profiling for {} secs'.format(duration))
+        self.end_time = time.monotonic() + duration
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+
+    def is_done(self, now):
+        return self.running and now >= self.end_time
+
+    def stop(self, objects):
+        """
+        Stops the capture, and writes the results
+        :param list objects: Transforms and variables to attribute time to
+        :return: Path to the text summary
+        """
+        self.profile.disable()
+        stats = pstats.Stats(self.profile)
+        self.profile = None
+
+        if not os.path.isdir(self.output_dir):
+            os.makedirs(self.output_dir)
+        base_path = os.path.join(
+            self.output_dir, 'driver-{}'.format(datetime.datetime.now().strftime('%Y%m%d-%H%M%S')))
+
+        stats.dump_stats(base_path + '.prof')
+
+        with open(base_path + '.txt', 'w') as f:
+            f.write('Time by class\n')
+            f.write('=============\n\n')
+            for line in self.format_attribution(stats, objects):
+                f.write(line + '\n')
+
+            f.write('\nTop functions\n')
+            f.write('=============\n')
+            listing = io.StringIO()
+            stats.stream = listing
+            stats.sort_stats('cumulative').print_stats(NUM_FUNCTIONS)
+            f.write(listing.getvalue())
+
+        print('    Wrote profile to {}.txt'.format(base_path))
+        return base_path + '.txt'
+
+    @staticmethod
+    def format_attribution(stats, objects):
+        """
+        Attributes profiled time to the class of each of the given objects,
+        via the code of the methods that the driver calls into. Instances
+        of the same class share code, so are combined
+        :param pstats.Stats stats:
+        :rtype: list[str]
+        """
+        classes = {}
+        for obj in objects:
+            cls = type(obj)
+            label = '{} ({})'.format(cls.__name__, getattr(obj, 'name', ''))
+            classes.setdefault(label, cls)
+
+        rows = []
+        for label, cls in classes.items():
+            methods = []
+            for method_name in ENTRY_POINTS:
+                method = getattr(cls, method_name, None)
+                if method is None or not hasattr(method, '__code__'):
+                    continue
+
+                calls, _, own_time, total_time, _ = stats.stats.get(get_code_key(method), (0, 0, 0.0, 0.0, None))
+                if calls:
+                    # Inherited methods are shared with other classes
+                    owner = next(base for base in cls.__mro__ if method_name in vars(base))
+                    shared = '' if owner is cls else ' (shared, from {})'.format(owner.__name__)
+                    methods.append((total_time, '    {:<20} {:>8} calls {:10.3f}s cumulative {:10.3f}s own{}'.format(
+                        method_name, calls, total_time, own_time, shared)))
+
+            if methods:
+                rows.append((max(methods)[0], label, [line for _, line in sorted(methods, reverse=True)]))
+
+        lines = []
+        for _, label, method_lines in sorted(rows, key=lambda row: row[0], reverse=True):
+            lines.append(label)
+            lines.extend(method_lines)
+        return lines
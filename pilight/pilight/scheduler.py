@@ -0,0 +1,154 @@
+import asyncio
+import time
+
+# How long before each deadline to stop sleeping, and spin instead (secs).
+# Sleeps can overshoot by a millisecond or more, particularly on a Pi
+SPIN_TIME = 0.002
+
+# With the catchup policy, the most frames that can be run back to back to
+# catch up - if further behind than this, the missed frames are skipped
+MAX_CATCHUP_FRAMES = 5
+
+OVERRUN_SKIP = 'skip'
+OVERRUN_CATCHUP = 'catchup'
+OVERRUN_POLICIES = (OVERRUN_SKIP, OVERRUN_CATCHUP)
+
+
+class FrameScheduler(object):
+    """
+    Paces the frame loop using absolute deadlines on a monotonic clock, so
+    that frames stay evenly spaced regardless of how long each one takes.
+    Deadlines are multiples of the interval from the first frame, so timing
+    errors don't accumulate. Waits sleep until just before each deadline,
+    then spin the rest of the way for accuracy.
+
+    If a frame runs past the next deadline (an overrun), the policy decides
+    what happens:
+      - skip: Missed deadlines are dropped, and the next frame waits for
+        the next deadline that hasn't passed yet
+      - catchup: Missed frames are run back to back, until the schedule
+        has caught up (up to MAX_CATCHUP_FRAMES)
+    """
+
+    def __init__(self, interval, overrun_policy=OVERRUN_SKIP, clock=time.monotonic):
+        if interval <= 0:
+            raise ValueError('Frame interval must be greater than 0, got {}'.format(interval))
+        if overrun_policy not in OVERRUN_POLICIES:
+            raise ValueError('Unknown overrun policy "{}", expected one of: {}'.format(
+                overrun_policy, ', '.join(OVERRUN_POLICIES)))
+
+        self.interval = interval
+        self.overrun_policy = overrun_policy
+        self.clock = clock
+        self.deadline = None
+        self.frame_start = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.frames = 0
+        self.missed = 0
+        self.skipped = 0
+        self.total_frame_time = 0.0
+        self.max_frame_time = 0.0
+        self.total_jitter = 0.0
+        self.max_jitter = 0.0
+        self.stats_start = self.clock()
+
+    def resync(self):
+        """
+        Starts a new schedule from the next frame - e.g. after pausing
+        """
+        self.deadline = None
+
+    def get_sleep_time(self):
+        now = self.clock()
+        if self.deadline is None:
+            self.deadline = now
+
+        # Sleep most of the way, then spin until the deadline
+        return self.deadline - now - SPIN_TIME
+
+    def wait(self):
+        """
+        Waits until the next frame is due, and returns the time that it was
+        scheduled for. Rendering frames for their scheduled time, rather
+        than the time they actually start, keeps animations smooth
+        :rtype: float
+        """
+        sleep_time = self.get_sleep_time()
+        if sleep_time > 0:
+            time.sleep(sleep_time)
+        return self.start_frame()
+
+    async def wait_async(self):
+        """
+        Version of wait() for use in an event loop - other tasks can run
+        while waiting. Always yields to the loop, even when behind schedule,
+        so that control messages are still delivered
+        :rtype: float
+        """
+        sleep_time = self.get_sleep_time()
+        await asyncio.sleep(max(sleep_time, 0))
+        return self.start_frame()
+
+    def start_frame(self):
+        while self.clock() < self.deadline:
+            pass
+
+        self.frame_start = self.clock()
+        jitter = self.frame_start - self.deadline
+        self.total_jitter += jitter
+        self.max_jitter = max(self.max_jitter, jitter)
+
+        return self.deadline
+
+    def frame_done(self):
+        """
+        Records the end of the current frame, and schedules the next one
+        """
+        now = self.clock()
+        frame_time = now - self.frame_start
+        self.frames += 1
+        self.total_frame_time += frame_time
+        self.max_frame_time = max(self.max_frame_time, frame_time)
+
+        on_time = self.frame_start - self.deadline < self.interval
+        self.deadline += self.interval
+        if now <= self.deadline:
+            return
+
+        # Overrun - only counted if this frame started on time, rather than
+        # being one of the frames catching up from a previous overrun
+        if on_time:
+            self.missed += 1
+        behind = int((now - self.deadline) / self.interval)
+        if self.overrun_policy == OVERRUN_SKIP or behind >= MAX_CATCHUP_FRAMES:
+            # Drop the missed deadlines, staying in step with the original schedule
+            self.skipped += behind + 1
+            self.deadline += (behind + 1) * self.interval
+
+    def get_stats(self):
+        elapsed = self.clock() - self.stats_start
+        frames = max(self.frames, 1)
+        return {
+            'fps': self.frames / elapsed if elapsed > 0 else 0.0,
+            'frames': self.frames,
+            'missed': self.missed,
+            'skipped': self.skipped,
+            'avg_frame_time': self.total_frame_time / frames,
+            'max_frame_time': self.max_frame_time,
+            'avg_jitter': self.total_jitter / frames,
+            'max_jitter': self.max_jitter,
+        }
+
+    def format_stats(self):
+        stats = self.get_stats()
+        return ('FPS: {:0.1f}, frame time: {:0.1f}ms avg, {:0.1f}ms max, jitter: {:0.2f}ms avg, {:0.2f}ms max, '
+                'missed deadlines: {}, skipped frames: {}').format(
+            stats['fps'],
+            stats['avg_frame_time'] * 1000,
+            stats['max_frame_time'] * 1000,
+            stats['avg_jitter'] * 1000,
+            stats['max_jitter'] * 1000,
+            stats['missed'],
+            stats['skipped'])
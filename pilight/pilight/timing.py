@@ -0,0 +1,87 @@
+import time
+
+import numpy as np
+
+# Number of recent samples kept for each timing
+WINDOW_SIZE = 512
+
+
+class TimingWindow(object):
+    """
+    Keeps the most recent durations recorded for a single timing, in a
+    preallocated ring, so that recording a sample is cheap. Percentiles
+    are only computed when a summary is requested.
+    """
+
+    def __init__(self, size=WINDOW_SIZE):
+        self.samples = np.zeros(size)
+        self.index = 0
+        self.count = 0
+
+    def record(self, duration):
+        self.samples[self.index] = duration
+        self.index = (self.index + 1) % len(self.samples)
+        self.count += 1
+
+    def get_summary(self):
+        samples = self.samples[:min(self.count, len(self.samples))]
+        p50, p95 = np.percentile(samples, [50, 95])
+        return {
+            'count': self.count,
+            'p50': float(p50),
+            'p95': float(p95),
+            'max': float(samples.max()),
+        }
+
+
+class FrameTimer(object):
+    """
+    Records how long each part of the frame takes - ticking each variable,
+    and ticking and running each transform - in named rolling windows.
+    """
+
+    def __init__(self):
+        self.windows = {}
+        self.start_time = time.time()
+
+    @staticmethod
+    def now():
+        return time.perf_counter()
+
+    def record(self, name, duration):
+        window = self.windows.get(name)
+        if window is None:
+            window = self.windows[name] = TimingWindow()
+        window.record(duration)
+
+    def get_summary(self):
+        """
+        Returns the p50, p95 and max durations (secs) for each timing, plus
+        the number of samples recorded, keyed on timing name
+        :rtype: dict
+        """
+        return {name: window.get_summary() for name, window in self.windows.items()}
+
+    def reset(self):
+        self.windows = {}
+        self.start_time = time.time()
+
+
+def format_summary(summary):
+    """
+    Formats a timing summary as a table, most expensive first
+    :rtype: list[str]
+    """
+    if not summary:
+        return []
+
+    width = max(len(name) for name in summary)
+    lines = ['{}  {:>9} {:>9} {:>9} {:>9}'.format('Timing'.ljust(width), 'p50 (ms)', 'p95 (ms)', 'max (ms)', 'samples')]
+    for name, timing in sorted(summary.items(), key=lambda item: item[1]['p95'], reverse=True):
+        lines.append('{}  {:9.3f} {:9.3f} {:9.3f} {:9d}'.format(
+            name.ljust(width),
+            timing['p50'] * 1000,
+            timing['p95'] * 1000,
+            timing['max'] * 1000,
+            timing['count']))
+    return lines